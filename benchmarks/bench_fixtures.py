@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of the fixture construction paths on in-memory and file based SQLite.
+
+Run from the root of the repository::
+
+    python -m benchmarks.bench_fixtures --n 100 1000 --depth 1 5 --output results.json
+
+The results are written as JSON. With ``--baseline`` the results are compared with the ones of an earlier run and the
+exit code is ``1`` if a case got slower than ``--threshold`` times the baseline.
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from timeit import default_timer
+
+from sqlalchemy import Table, Column, Integer, ForeignKey, Unicode, create_engine, event
+from sqlalchemy.ext import hybrid
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, sessionmaker
+
+from sqlalchemy_fixture_factory import sqla_fix_fact
+from sqlalchemy_fixture_factory.materializer import materialize
+from sqlalchemy_fixture_factory.sqla_fix_fact import SqlaFixFact, BaseFix
+
+ENGINES = ('memory', 'file')
+
+# number of roles of each account in the many-to-many case
+ROLES_PER_ACCOUNT = 10
+
+
+def create_models(Base):
+    account_role = Table('account_role', Base.metadata,
+                         Column('id_account', Integer, ForeignKey('account.id')),
+                         Column('id_role', Integer, ForeignKey('role.id')))
+
+    class Role(Base):
+        __tablename__ = 'role'
+
+        id = Column(Integer, primary_key=True)
+        name = Column(Unicode)
+
+    class Account(Base):
+        __tablename__ = 'account'
+
+        id = Column(Integer, primary_key=True)
+        name = Column('name', Unicode)
+
+        roles = relationship(Role, secondary=account_role)
+
+    class Person(Base):
+        __tablename__ = 'person'
+
+        id = Column(Integer, primary_key=True)
+        first_name = Column(Unicode)
+        last_name = Column(Unicode)
+        account_id = Column(Integer, ForeignKey('account.id'))
+        account = relationship(Account)
+
+        @hybrid.hybrid_property
+        def full_name(self):
+            return '%s %s' % (self.first_name, self.last_name)
+
+        @full_name.setter
+        def full_name(self, value):
+            self.first_name, self.last_name = value.split(' ', 1)
+
+    class Node(Base):
+        __tablename__ = 'node'
+
+        id = Column(Integer, primary_key=True)
+        name = Column(Unicode)
+        parent_id = Column(Integer, ForeignKey('node.id'))
+        parent = relationship('Node', remote_side=[id])
+
+    return Role, Account, Person, Node
+
+
+class Scenario(object):
+    """
+    Models and fixtures of a benchmark, on a fresh DB
+    """
+
+    def __init__(self, engine_name, tmp_dir):
+        self.Base = declarative_base()
+        self.Role, self.Account, self.Person, self.Node = create_models(self.Base)
+
+        if engine_name == 'memory':
+            url = 'sqlite://'
+        else:
+            path = os.path.join(tmp_dir, 'bench.db')
+            if os.path.exists(path):
+                os.remove(path)
+            url = 'sqlite:///' + path
+        self.engine = create_engine(url)
+        self.Base.metadata.create_all(self.engine)
+
+        self.statements = 0
+        event.listen(self.engine, 'before_cursor_execute', self.count_statement)
+
+        self.db_session = sessionmaker(bind=self.engine)()
+        self.fix_fact = SqlaFixFact(self.db_session)
+
+        self.define_fixtures()
+
+    def count_statement(self, *args):
+        self.statements += 1
+
+    def define_fixtures(self):
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+
+        class FixHybridPerson(BaseFix):
+            MODEL = self.Person
+            full_name = 'Franz Huber'
+
+        roles = []
+        for i in range(ROLES_PER_ACCOUNT):
+            roles.append(sqla_fix_fact.subFactoryGet(type(str('FixRole%d' % i), (BaseFix,), {
+                'MODEL': self.Role,
+                'name': 'role %d' % i,
+            })))
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'peter'
+
+        FixAccount.roles = roles
+
+        self.FixPerson = FixPerson
+        self.FixHybridPerson = FixHybridPerson
+        self.FixAccount = FixAccount
+
+    def chain(self, depth):
+        """
+        :return: fixture of a node with ``depth`` ancestors, each one referenced via subFactoryCreate
+        """
+        Fixture = type(str('FixNode0'), (BaseFix,), {'MODEL': self.Node, 'name': 'node 0'})
+        for i in range(1, depth + 1):
+            Fixture = type(str('FixNode%d' % i), (BaseFix,), {
+                'MODEL': self.Node,
+                'name': 'node %d' % i,
+                'parent': sqla_fix_fact.subFactoryCreate(Fixture),
+            })
+        return Fixture
+
+    def close(self):
+        self.db_session.close()
+        self.engine.dispose()
+
+
+def bench_model(s, n, depth):
+    for i in range(n):
+        s.FixPerson(s.fix_fact).model()
+
+
+def bench_create(s, n, depth):
+    for i in range(n):
+        s.FixPerson(s.fix_fact).create()
+
+
+def bench_get_miss(s, n, depth):
+    for i in range(n):
+        s.FixPerson(s.fix_fact, first_name='Franz %d' % i).get()
+
+
+def bench_get_hit(s, n, depth):
+    s.FixPerson(s.fix_fact).get()
+    for i in range(n):
+        s.FixPerson(s.fix_fact).get()
+
+
+def bench_chain(s, n, depth):
+    Fixture = s.chain(depth)
+    for i in range(n):
+        Fixture(s.fix_fact).create()
+
+
+def bench_many_to_many(s, n, depth):
+    for i in range(n):
+        s.FixAccount(s.fix_fact).create()
+
+
+def bench_hybrid(s, n, depth):
+    for i in range(n):
+        s.FixHybridPerson(s.fix_fact).create()
+
+
+def bench_create_batch(s, n, depth):
+    s.FixPerson(s.fix_fact).create_batch(n, pk_only=True)
+
+
+def bench_insert_core(s, n, depth):
+    s.FixPerson(s.fix_fact).insert(n)
+
+
+def bench_materialize_chain(s, n, depth):
+    Fixture = s.chain(depth)
+    materialize(s.fix_fact, [Fixture(s.fix_fact) for i in range(n)], pk_only=True)
+
+
+# name -> (function, uses depth)
+CASES = {
+    'model': (bench_model, False),
+    'create': (bench_create, False),
+    'get_miss': (bench_get_miss, False),
+    'get_hit': (bench_get_hit, False),
+    'chain': (bench_chain, True),
+    'many_to_many': (bench_many_to_many, False),
+    'hybrid': (bench_hybrid, False),
+    'create_batch': (bench_create_batch, False),
+    'insert_core': (bench_insert_core, False),
+    'materialize_chain': (bench_materialize_chain, True),
+}
+
+
+def run(ns, depths, engines=ENGINES, cases=None):
+    """
+    Runs the benchmarks.
+
+    :param ns: list of numbers of fixtures to build per case
+    :param depths: list of depths of the reference chains, for the cases using chains
+    :param engines: names of the engines to run the cases on, see :data:`ENGINES`
+    :param cases: names of the cases to run, all of :data:`CASES` by default
+    :return: list of results, one dict per case, engine, n and depth
+    """
+    results = []
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for name in sorted(cases or CASES):
+            fn, uses_depth = CASES[name]
+            for engine_name in engines:
+                for n in ns:
+                    for depth in (depths if uses_depth else [0]):
+                        scenario = Scenario(engine_name, tmp_dir)
+                        try:
+                            start = default_timer()
+                            fn(scenario, n, depth)
+                            scenario.db_session.flush()
+                            seconds = default_timer() - start
+                        finally:
+                            scenario.close()
+
+                        results.append({
+                            'case': name,
+                            'engine': engine_name,
+                            'n': n,
+                            'depth': depth,
+                            'seconds': seconds,
+                            'us_per_fixture': seconds / n * 1e6,
+                            'statements': scenario.statements,
+                        })
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares the results with the ones of a baseline run.
+
+    :param threshold: factor a case may be slower than the baseline
+    :return: list of (result, baseline result) which exceed the threshold
+    """
+    def key(r):
+        return r['case'], r['engine'], r['n'], r['depth']
+
+    baseline = dict((key(r), r) for r in baseline)
+    return [(r, baseline[key(r)]) for r in results
+            if key(r) in baseline and r['seconds'] > baseline[key(r)]['seconds'] * threshold]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--n', type=int, nargs='+', default=[100, 1000], help='numbers of fixtures per case')
+    parser.add_argument('--depth', type=int, nargs='+', default=[1, 5], help='depths of the reference chains')
+    parser.add_argument('--engine', nargs='+', choices=ENGINES, default=list(ENGINES))
+    parser.add_argument('--case', nargs='+', choices=sorted(CASES), help='cases to run, all by default')
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--baseline', help='JSON file with results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='factor a case may be slower than the baseline, default: 1.2')
+    args = parser.parse_args(argv)
+
+    results = run(args.n, args.depth, args.engine, args.case)
+
+    for r in results:
+        print('%(case)-18s %(engine)-6s n=%(n)-6d depth=%(depth)-3d %(seconds)8.3fs %(us_per_fixture)10.1fus/fixture '
+              '%(statements)7d statements' % r)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        for r, b in regressions:
+            print('REGRESSION %s %s n=%d depth=%d: %.3fs, baseline %.3fs'
+                  % (r['case'], r['engine'], r['n'], r['depth'], r['seconds'], b['seconds']))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
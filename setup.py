@@ -38,18 +38,27 @@ setup(
     description='Test Fixture Factory for SQLAlchemy. Inspired by Ruby\'s factory_girl',
     keywords='SQLAlchemy test fixtures database-testing scenario builder',
     long_description=open('README.rst').read(),
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     zip_safe=False,
     include_package_data=True,
     platforms='any',
+    python_requires='>=3.7',
     install_requires=[
-        'SQLAlchemy>=0.7',
+        'SQLAlchemy>=1.0',
     ],
+    extras_require={
+        'asyncio': ['SQLAlchemy[asyncio]>=1.4'],
+    },
     setup_requires=[] + pytest_runner,
     test_suite='tests',
     tests_require=[
         'pytest',
     ],
+    entry_points={
+        'pytest11': [
+            'sqlalchemy_fixture_factory = sqlalchemy_fixture_factory.pytest_plugin',
+        ],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
 
@@ -61,12 +70,12 @@ setup(
 
         'Operating System :: OS Independent',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.2',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ],
 )
\ No newline at end of file
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+Entry point of ``python -m sqlalchemy_fixture_factory``, see :mod:`.cli`
+"""
+import sys
+
+from sqlalchemy_fixture_factory.cli import main
+
+sys.exit(main())
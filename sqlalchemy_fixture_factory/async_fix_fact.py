@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+Fixture Factory for SQLAlchemy's asyncio extension
+"""
+from sqlalchemy_fixture_factory.materializer import materialize
+from sqlalchemy_fixture_factory.sqla_fix_fact import SqlaFixFact
+
+
+class AsyncSqlaFixFact(object):
+    """
+    Fixture factory manager for an ``AsyncSession``.
+
+    The fixtures are the same :class:`.BaseFix` classes as for :class:`.SqlaFixFact`. They are built by the
+    synchronous implementation, run via ``AsyncSession.run_sync()`` on the async driver (e.g. aiosqlite), and all
+    methods are awaitable:
+
+    .. code-block:: python
+
+        fix_fact = AsyncSqlaFixFact(async_session)
+        arnold = await fix_fact.create(ArnoldPerson, first_name='Arnold')
+
+    Note that lazy loading of relationships is not available in async code, use eager loading or
+    ``AsyncSession.refresh()`` for relationships which were not set by the fixture.
+    """
+    async_session = None
+    fix_fact = None
+
+    def __init__(self, async_session, **kwargs):
+        """
+        :param async_session: SQLAlchemy ``AsyncSession``
+        :param kwargs: *Optional:* sharding options, see :class:`.SqlaFixFact`
+        """
+        assert async_session, 'Passed in DB session is None!'
+        self.async_session = async_session
+        # synchronous factory, shares the registry and the session with this one
+        self.fix_fact = SqlaFixFact(async_session.sync_session, **kwargs)
+
+    @property
+    def instances(self):
+        return self.fix_fact.instances
+
+    async def _run(self, fn, *args, **kwargs):
+        return await self.async_session.run_sync(lambda sync_session: fn(*args, **kwargs))
+
+    async def get(self, Fixture, **kwargs):
+        """
+        Awaitable version of :meth:`.BaseFix.get`.
+
+        :param Fixture: fixture class
+        :param kwargs: *Optional:* key words to overwrite properties of this fixture
+        :return: SQLAlchemy Model instance
+        """
+        return await self._run(self.fix_fact.get, Fixture, **kwargs)
+
+    async def create(self, Fixture, **kwargs):
+        """
+        Awaitable version of :meth:`.BaseFix.create`.
+
+        :param Fixture: fixture class
+        :param kwargs: *Optional:* key words to overwrite properties of this fixture
+        :return: SQLAlchemy Model instance
+        """
+        return await self._run(lambda: Fixture(self.fix_fact, **kwargs).create())
+
+    async def model(self, Fixture, **kwargs):
+        """
+        Awaitable version of :meth:`.BaseFix.model`, the references of the model are created in the DB.
+
+        :param Fixture: fixture class
+        :param kwargs: *Optional:* key words to overwrite properties of this fixture
+        :return: SQLAlchemy Model instance
+        """
+        return await self._run(lambda: Fixture(self.fix_fact, **kwargs).model())
+
+    async def create_batch(self, Fixture, n, overrides=None, pk_only=False, **kwargs):
+        """
+        Awaitable version of :meth:`.BaseFix.create_batch`.
+
+        :param Fixture: fixture class
+        :param n: number of instances to create
+        :param overrides: *Optional:* per row key words, see :meth:`.BaseFix.create_batch`
+        :param pk_only: if ``True`` only the primary keys of the created rows are returned
+        :param kwargs: *Optional:* key words to overwrite properties of all rows
+        :return: list of SQLAlchemy Model instances or primary keys
+        """
+        return await self._run(lambda: Fixture(self.fix_fact, **kwargs).create_batch(n, overrides, pk_only))
+
+    async def materialize(self, roots, pk_only=False):
+        """
+        Awaitable version of :func:`.materialize`. Fixture instances in ``roots`` have to be created with
+        :attr:`fix_fact`, sub-factories can be used as well.
+
+        Independent references do not need to be resolved concurrently, they are inserted with one bulk statement
+        per table anyway.
+        """
+        return await self._run(materialize, self.fix_fact, roots, pk_only)
+
+    async def rebind(self, async_session, lazy=False):
+        """
+        Awaitable version of :meth:`.SqlaFixFact.rebind`, moves this factory and its registered fixtures to another
+        ``AsyncSession``.
+        """
+        self.async_session = async_session
+        await self._run(self.fix_fact.rebind, async_session.sync_session, lazy)
+
+    def batch(self):
+        """
+        Async context manager which defers the flushes until the end of the block, see :meth:`.SqlaFixFact.batch`.
+        """
+        return _AsyncBatch(self)
+
+    async def flush(self):
+        await self.async_session.flush()
+
+
+class _AsyncBatch(object):
+
+    def __init__(self, async_fix_fact):
+        self.async_fix_fact = async_fix_fact
+        self.batch = async_fix_fact.fix_fact.batch()
+
+    async def __aenter__(self):
+        self.batch.__enter__()
+        return self.async_fix_fact
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # the flush at the end of the block needs to run on the async driver
+        return await self.async_fix_fact._run(self.batch.__exit__, exc_type, exc_value, traceback)
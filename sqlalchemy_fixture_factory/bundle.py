@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+Portable seed bundles: the rows of fixture scenarios in a versioned JSON Lines file
+"""
+import base64
+import datetime
+import decimal
+import gzip
+import io
+import json
+import uuid
+
+from sqlalchemy import inspect
+
+from sqlalchemy_fixture_factory.cache import _register, _registered_identities
+from sqlalchemy_fixture_factory.materializer import materialize
+from sqlalchemy_fixture_factory.sqla_fix_fact import _reset_sequence
+
+BUNDLE_FORMAT = 'sqlalchemy-fixture-factory-bundle'
+
+# increase if the format of the bundles changes
+BUNDLE_VERSION = 1
+
+# number of rows per executemany when loading a bundle
+LOAD_CHUNK_SIZE = 1000
+
+
+def write_bundle(fix_fact, metadata, roots, path):
+    """
+    Builds the given fixtures with :func:`.materialize` and writes the rows of all tables of ``metadata`` into a
+    bundle, to be loaded with :func:`load_bundle` into any DB with the same schema.
+
+    The bundle is a JSON Lines file: a header, then for each table (in the order of their dependencies) a line with the
+    table name and its columns, followed by one line per row. Dates, times, decimals, UUIDs and binary values are
+    tagged, e.g. ``{"$date": "2015-06-01"}``. A path ending with ``.gz`` is compressed.
+
+    Like with :class:`.FixtureCache`, the fixtures are expected to be built into empty tables.
+
+    :param fix_fact: instance of :class:`.SqlaFixFact`
+    :param metadata: ``MetaData`` of the tables to write
+    :param roots: fixture instance or sub-factory, or a list of them, see :func:`.materialize`
+    :param path: path of the bundle file
+    :return: SQLAlchemy Model instance for each root, a list if ``roots`` is a list
+    """
+    single = not isinstance(roots, (list, tuple))
+    if single:
+        roots = [roots]
+
+    db_session = fix_fact.get_db_session()
+    instances = materialize(fix_fact, roots)
+
+    with _open(path, 'w') as f:
+        _write_line(f, {
+            'format': BUNDLE_FORMAT,
+            'version': BUNDLE_VERSION,
+            'tables': [table.name for table in metadata.sorted_tables],
+            'registered': _registered_identities(fix_fact, roots),
+            'roots': [inspect(inst).identity for inst in instances],
+        })
+        for table in metadata.sorted_tables:
+            keys = [c.key for c in table.columns]
+            _write_line(f, {'table': table.name, 'columns': keys})
+            for row in db_session.execute(table.select()):
+                _write_line(f, list(row))
+
+    return instances[0] if single else instances
+
+
+def load_bundle(fix_fact, metadata, path, roots=None):
+    """
+    Inserts the rows of a bundle written by :func:`write_bundle`, with one executemany per table and
+    :data:`LOAD_CHUNK_SIZE` rows.
+
+    If the ``roots`` the bundle was written with are passed in as well, the fixtures referenced by them via
+    :func:`.subFactoryGet` are registered in ``fix_fact`` and the root instances are returned.
+
+    :param fix_fact: instance of :class:`.SqlaFixFact`
+    :param metadata: ``MetaData`` of the tables, with the same schema as the one the bundle was written with
+    :param path: path of the bundle file
+    :param roots: *Optional:* fixture instance or sub-factory, or a list of them
+    :return: SQLAlchemy Model instance for each root if ``roots`` are given, a list if ``roots`` is a list
+    """
+    db_session = fix_fact.get_db_session()
+
+    with _open(path, 'r') as f:
+        header = json.loads(f.readline())
+        if header.get('format') != BUNDLE_FORMAT:
+            raise ValueError('%s is no seed bundle' % path)
+        if header['version'] != BUNDLE_VERSION:
+            raise ValueError('Seed bundle %s has version %r, expected %d' % (path, header['version'], BUNDLE_VERSION))
+
+        table, keys, rows = None, None, []
+        for line in f:
+            value = json.loads(line, object_hook=_decode)
+            if isinstance(value, dict):
+                _insert(db_session, table, keys, rows)
+                table, keys, rows = _table(metadata, value), value['columns'], []
+            else:
+                rows.append(value)
+                if len(rows) >= LOAD_CHUNK_SIZE:
+                    _insert(db_session, table, keys, rows, reset_sequence=False)
+                    rows = []
+        _insert(db_session, table, keys, rows)
+
+    if roots is None:
+        return None
+
+    single = not isinstance(roots, (list, tuple))
+    result = _register(fix_fact, [roots] if single else roots, _decode_identities(header['registered']),
+                       [tuple(_decode_value(v) for v in identity) for identity in header['roots']])
+    return result[0] if single else result
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, mode + 'b'), encoding='utf-8')
+    return io.open(path, mode, encoding='utf-8')
+
+
+def _write_line(f, value):
+    f.write(json.dumps(value, default=_encode, separators=(',', ':')) + '\n')
+
+
+def _table(metadata, header):
+    table = metadata.tables.get(header['table'])
+    if table is None:
+        raise ValueError('Table %s of the seed bundle is missing' % header['table'])
+    missing = set(header['columns']) - set(c.key for c in table.columns)
+    if missing:
+        raise ValueError('Columns %s of table %s of the seed bundle are missing' % (', '.join(sorted(missing)),
+                                                                                    table.name))
+    return table
+
+
+def _insert(db_session, table, keys, rows, reset_sequence=True):
+    if rows:
+        db_session.execute(table.insert(), [dict(zip(keys, row)) for row in rows])
+    if table is not None and reset_sequence:
+        _reset_sequence(db_session, table)
+
+
+def _encode(value):
+    """
+    Converts values which are not supported by JSON into tagged dicts, see :func:`_decode`.
+    """
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    elif isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    elif isinstance(value, datetime.time):
+        return {'$time': value.isoformat()}
+    elif isinstance(value, datetime.timedelta):
+        return {'$timedelta': value.total_seconds()}
+    elif isinstance(value, decimal.Decimal):
+        return {'$decimal': str(value)}
+    elif isinstance(value, uuid.UUID):
+        return {'$uuid': str(value)}
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return {'$bytes': base64.b64encode(bytes(value)).decode('ascii')}
+    raise TypeError('Value of type %s can not be written into a seed bundle: %r' % (type(value).__name__, value))
+
+
+_DECODERS = {
+    '$datetime': datetime.datetime.fromisoformat,
+    '$date': datetime.date.fromisoformat,
+    '$time': datetime.time.fromisoformat,
+    '$timedelta': lambda v: datetime.timedelta(seconds=v),
+    '$decimal': decimal.Decimal,
+    '$uuid': uuid.UUID,
+    '$bytes': lambda v: base64.b64decode(v.encode('ascii')),
+}
+
+
+def _decode(value):
+    if len(value) == 1:
+        tag, v = next(iter(value.items()))
+        if tag in _DECODERS:
+            return _DECODERS[tag](v)
+    return value
+
+
+def _decode_value(value):
+    return _decode(value) if isinstance(value, dict) else value
+
+
+def _decode_identities(registered):
+    return dict((key, tuple(_decode_value(v) for v in identity)) for key, identity in registered.items())
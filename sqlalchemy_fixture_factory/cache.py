@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+On-disk cache of seeded fixture scenarios
+"""
+import hashlib
+import inspect as pyinspect
+import os
+import pickle
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateTable
+
+from sqlalchemy_fixture_factory.materializer import materialize
+from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix, SubFactory, METHOD_CREATE, METHOD_GET, registry_key, \
+    _load_by_pk, _reset_sequence
+
+# increase if the format of the cache files changes
+CACHE_VERSION = 1
+
+
+class FixtureCache(object):
+    """
+    Builds fixture scenarios once and saves the resulting rows in a cache directory. Later runs load the rows with
+    bulk inserts instead of building the fixtures again.
+
+    The cache key is a hash of the schema (``MetaData``), of the source of all fixture classes involved and of their
+    ``kwargs``. Thus a cached scenario is rebuilt automatically as soon as one of them changes.
+
+    The scenario is expected to be seeded into empty tables: all rows of the tables of ``metadata`` are saved.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        :param cache_dir: directory for the cache files, created if missing
+        """
+        self.cache_dir = cache_dir
+
+    def key(self, fix_fact, metadata, roots):
+        """
+        :return: cache key of the scenario as hex string
+        """
+        dialect = fix_fact.get_db_session().get_bind().dialect
+        digest = hashlib.sha1(('%d\n' % CACHE_VERSION).encode('utf-8'))
+        for table in metadata.sorted_tables:
+            digest.update(str(CreateTable(table).compile(dialect=dialect)).encode('utf-8'))
+
+        sources = set()
+        for Fixture, kwargs, method in _walk(fix_fact, roots):
+            digest.update(_fingerprint((Fixture, kwargs, method)).encode('utf-8'))
+            sources.add(Fixture)
+        for Fixture in sorted(sources, key=_fingerprint):
+            digest.update(_source(Fixture).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def seed(self, fix_fact, metadata, roots):
+        """
+        Seeds the DB with the given fixtures, from the cache if possible. Otherwise they are built with
+        :func:`.materialize` and the rows are saved in the cache. In both cases the fixtures referenced via
+        :func:`.subFactoryGet` are registered in ``fix_fact``.
+
+        :param fix_fact: instance of :class:`.SqlaFixFact`
+        :param metadata: ``MetaData`` of the tables to save
+        :param roots: fixture instance or sub-factory, or a list of them, see :func:`.materialize`
+        :return: SQLAlchemy Model instance for each root, a list if ``roots`` is a list
+        """
+        single = not isinstance(roots, (list, tuple))
+        if single:
+            roots = [roots]
+
+        path = os.path.join(self.cache_dir, self.key(fix_fact, metadata, roots) + '.pickle')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                result = self._load(fix_fact, metadata, roots, pickle.load(f))
+        else:
+            result = materialize(fix_fact, roots)
+            self._save(path, fix_fact, metadata, roots, result)
+
+        return result[0] if single else result
+
+    def _save(self, path, fix_fact, metadata, roots, instances):
+        db_session = fix_fact.get_db_session()
+
+        tables = []
+        for table in metadata.sorted_tables:
+            keys = [c.key for c in table.columns]
+            rows = [tuple(row) for row in db_session.execute(table.select())]
+            tables.append((table.name, keys, rows))
+
+        data = {
+            'tables': tables,
+            'registered': _registered_identities(fix_fact, roots),
+            'roots': [inspect(inst).identity for inst in instances],
+        }
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+
+    def _load(self, fix_fact, metadata, roots, data):
+        db_session = fix_fact.get_db_session()
+
+        for name, keys, rows in data['tables']:
+            if rows:
+                table = metadata.tables[name]
+                db_session.execute(table.insert(), [dict(zip(keys, row)) for row in rows])
+                _reset_sequence(db_session, table)
+
+        return _register(fix_fact, roots, data['registered'], data['roots'])
+
+
+def _registered_identities(fix_fact, roots):
+    """
+    Returns the primary keys of the fixtures referenced via get by the roots, by their fingerprint.
+    """
+    registered = {}
+    for Fixture, kwargs, method in _walk(fix_fact, roots):
+        if method == METHOD_GET:
+            inst = fix_fact.instances[registry_key(Fixture, kwargs)]
+            registered[_fingerprint((Fixture, kwargs, method))] = inspect(inst).identity
+    return registered
+
+
+def _register(fix_fact, roots, registered, root_identities):
+    """
+    Registers the fixtures referenced via get by the roots after their rows were loaded and loads the roots.
+
+    :param registered: primary keys of the registered fixtures, see :func:`_registered_identities`
+    :param root_identities: primary keys of the roots
+    :return: SQLAlchemy Model instance for each root
+    """
+    db_session = fix_fact.get_db_session()
+
+    by_fixture = {}
+    for Fixture, kwargs, method in _walk(fix_fact, roots):
+        if method == METHOD_GET:
+            identity = registered[_fingerprint((Fixture, kwargs, method))]
+            by_fixture.setdefault(Fixture, []).append((registry_key(Fixture, kwargs), identity))
+    for Fixture, entries in by_fixture.items():
+        pks = [identity[0] if len(identity) == 1 else identity for key, identity in entries]
+        for (key, identity), inst in zip(entries, _load_by_pk(db_session, Fixture.MODEL, Fixture._get_plan(),
+                                                              pks)):
+            fix_fact.instances[key] = inst
+
+    result = []
+    for root, identity in zip(roots, root_identities):
+        Fixture = root.fixture if isinstance(root, SubFactory) else root.__class__
+        result.extend(_load_by_pk(db_session, Fixture.MODEL, Fixture._get_plan(),
+                                  [identity[0] if len(identity) == 1 else identity]))
+    return result
+
+
+def _walk(fix_fact, roots):
+    """
+    Returns (fixture class, kwargs, method) of the roots and all fixtures referenced by them, each once.
+    """
+    seen = set()
+    result = []
+
+    def visit(Fixture, kwargs, method):
+        key = (registry_key(Fixture, kwargs), method)
+        if key in seen:
+            return
+        seen.add(key)
+        result.append((Fixture, kwargs, method))
+
+        fixture = Fixture(fix_fact, **kwargs)
+        attrs = fixture.getRawAttributes()
+        for attr_key in fixture._plan.reference_keys:
+            value = attrs.get(attr_key)
+            try:
+                values = list(value)
+            except TypeError as e:
+                # not a list, a single reference
+                values = [value]
+            for v in values:
+                if isinstance(v, SubFactory):
+                    visit(v.fixture, v.kwargs, v.method)
+
+    for root in roots:
+        if isinstance(root, SubFactory):
+            visit(root.fixture, root.kwargs, root.method)
+        else:
+            visit(root.__class__, root._kwargs, METHOD_CREATE)
+    return result
+
+
+def _fingerprint(value):
+    """
+    Returns a text representation of ``value`` which is stable across processes.
+    """
+    if isinstance(value, SubFactory):
+        return 'SubFactory(%s, %s, %s)' % (_fingerprint(value.fixture), value.method, _fingerprint(value.kwargs))
+    elif isinstance(value, type):
+        return '%s.%s' % (value.__module__, getattr(value, '__qualname__', value.__name__))
+    elif isinstance(value, dict):
+        return '{%s}' % ', '.join(sorted('%r: %s' % (k, _fingerprint(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return '%s(%s)' % (type(value).__name__, ', '.join(_fingerprint(v) for v in value))
+    return repr(value)
+
+
+def _source(Fixture):
+    """
+    Returns the source code of a fixture class and of its fixture base classes.
+    """
+    sources = []
+    for cls in pyinspect.getmro(Fixture):
+        if cls is BaseFix or cls is object:
+            break
+        try:
+            sources.append(pyinspect.getsource(cls))
+        except (IOError, OSError, TypeError) as e:
+            # no source available, use the declared attributes instead
+            sources.append(_fingerprint(dict((k, v) for k, v in vars(cls).items() if not k.startswith('__'))))
+    return '\n'.join(sources)
+
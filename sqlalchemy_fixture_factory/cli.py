@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+Command line interface, run as ``python -m sqlalchemy_fixture_factory``.
+
+``seed`` populates a DB with rows of a fixture, e.g. to build a DB for performance tests::
+
+    python -m sqlalchemy_fixture_factory seed --url postgresql://localhost/perf myapp.fixtures:ArnoldPerson \\
+        --count 1000000 --batch-size 10000
+
+The rows are inserted in chunks with :meth:`.BaseFix.stream`, with Core inserts if the fixture can be expressed as
+plain rows. After each chunk the throughput, the number of SQL statements and the peak memory are printed.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+import argparse
+import importlib
+import sys
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_fixture_factory.sqla_fix_fact import SqlaFixFact, BaseFix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sqlalchemy_fixture_factory',
+                                     description='SQLAlchemy Fixture Factory')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    seed = commands.add_parser('seed', help='populate a DB with rows of a fixture')
+    seed.add_argument('target', help='fixture class as "module:FixtureClass"')
+    seed.add_argument('--url', required=True, help='DB URL of the engine')
+    seed.add_argument('--count', type=int, default=1000, help='number of rows, default: 1000')
+    seed.add_argument('--batch-size', type=int, default=1000, help='number of rows per chunk, default: 1000')
+    seed.add_argument('--seed', type=int, default=0, help='seed of the random numbers of the factory, default: 0')
+    seed.add_argument('--create-tables', action='store_true', help='create the tables of the model if missing')
+    seed.add_argument('--orm', action='store_true', help='insert with the ORM even if Core inserts are possible')
+    args = parser.parse_args(argv)
+
+    try:
+        Fixture = load_fixture(args.target)
+    except (ImportError, AttributeError, ValueError) as e:
+        parser.error(str(e))
+
+    return seed_db(Fixture, args.url, args.count, args.batch_size, args.seed, args.create_tables, not args.orm)
+
+
+def load_fixture(target):
+    """
+    :param target: fixture class as ``module:FixtureClass``
+    :return: the fixture class
+    """
+    module_name, sep, name = target.partition(':')
+    if not sep or not module_name or not name:
+        raise ValueError('Expected the fixture as "module:FixtureClass", got %r' % target)
+
+    Fixture = getattr(importlib.import_module(module_name), name)
+    if not (isinstance(Fixture, type) and issubclass(Fixture, BaseFix)):
+        raise ValueError('%s is no fixture class' % target)
+    return Fixture
+
+
+def seed_db(Fixture, url, count, batch_size=1000, seed=0, create_tables=False, core=True, out=None):
+    """
+    Inserts ``count`` rows of a fixture and prints the progress.
+
+    :param core: use Core inserts (see :meth:`.BaseFix.insert`) if the fixture can be expressed as plain rows
+    :return: exit code
+    """
+    out = out or sys.stdout
+    engine = create_engine(url)
+    if create_tables:
+        Fixture.MODEL.metadata.create_all(engine)
+
+    statements = [0]
+
+    def count_statement(*args):
+        statements[0] += 1
+
+    event.listen(engine, 'before_cursor_execute', count_statement)
+
+    db_session = sessionmaker(bind=engine)()
+    try:
+        fixture = Fixture(SqlaFixFact(db_session, seed=seed))
+        core = core and _is_plain_row(fixture)
+        print('Seeding %d rows of %s.%s with %s inserts' % (count, Fixture.__module__, Fixture.__name__,
+                                                           'Core' if core else 'ORM'), file=out)
+
+        progress = None
+        for progress in fixture.stream(count, batch_size, progress=True, core=core):
+            print(_format_progress(progress, statements[0]), file=out)
+            out.flush()
+        if progress is not None:
+            print('Done: ' + _format_progress(progress, statements[0]), file=out)
+    finally:
+        db_session.close()
+        engine.dispose()
+    return 0
+
+
+def _is_plain_row(fixture):
+    plan = fixture._plan
+    return plan.core_columns is not None and not plan.use_update and \
+        plan.bulk_keys.issuperset(fixture.getRawAttributes())
+
+
+def _format_progress(progress, statements):
+    rate = progress.done / progress.seconds if progress.seconds else 0.0
+    peak = _peak_memory()
+    return '%10d/%d rows %8.1fs %12.0f rows/s %8d statements %10s peak memory' % (
+        progress.done, progress.total, progress.seconds, rate, statements,
+        '%.1f MiB' % (peak / 2.0 ** 20) if peak is not None else 'n/a')
+
+
+def _peak_memory():
+    """
+    :return: peak resident memory of this process in bytes, None if not available on this platform
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
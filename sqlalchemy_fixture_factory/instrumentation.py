@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+Timing and SQL statement statistics per fixture, see :meth:`.SqlaFixFact.instrument`
+"""
+from contextlib import contextmanager
+from timeit import default_timer
+
+from sqlalchemy import event
+
+
+class FixtureStats(object):
+    """
+    Statistics of one method (``model``, ``create`` or ``get``) of one fixture class
+    """
+    __slots__ = ('fixture', 'method', 'calls', 'seconds', 'flushes', 'statements')
+
+    def __init__(self, fixture, method):
+        self.fixture = fixture
+        self.method = method
+        self.calls = 0
+        # wall time, including the time of the referenced fixtures
+        self.seconds = 0.0
+        # flushes and SQL statements while this fixture was the innermost one being built
+        self.flushes = 0
+        self.statements = 0
+
+    def __repr__(self):
+        return '<FixtureStats %s.%s: %d calls, %.3fs, %d flushes, %d statements>' % (
+            self.fixture.__name__, self.method, self.calls, self.seconds, self.flushes, self.statements)
+
+
+class Instrumentation(object):
+    """
+    Records calls, wall time, flushes and SQL statements per fixture class and method.
+
+    Statements and flushes are attributed to the fixture which is currently built, the innermost one if fixtures
+    reference other fixtures.
+    """
+
+    def __init__(self, db_session):
+        self.stats = {}
+        self._stack = []
+        self.attach(db_session)
+
+    def attach(self, db_session):
+        """
+        Starts recording the SQL statements and flushes of ``db_session``, see :meth:`.SqlaFixFact.rebind`.
+        """
+        self.db_session = db_session
+        self._bind = db_session.get_bind()
+
+        event.listen(self._bind, 'before_cursor_execute', self._on_statement)
+        event.listen(db_session, 'after_flush', self._on_flush)
+
+    def detach(self):
+        """
+        Stops recording SQL statements and flushes, the statistics are kept. See :meth:`.SqlaFixFact.uninstrument`.
+        """
+        event.remove(self._bind, 'before_cursor_execute', self._on_statement)
+        event.remove(self.db_session, 'after_flush', self._on_flush)
+
+    @contextmanager
+    def measure(self, Fixture, method):
+        key = (Fixture, method)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = FixtureStats(Fixture, method)
+
+        stats.calls += 1
+        self._stack.append(stats)
+        start = default_timer()
+        try:
+            yield stats
+        finally:
+            stats.seconds += default_timer() - start
+            self._stack.pop()
+
+    def _on_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if self._stack:
+            self._stack[-1].statements += 1
+
+    def _on_flush(self, db_session, flush_context):
+        if self._stack:
+            self._stack[-1].flushes += 1
+
+    def report(self, top=None, sort='seconds'):
+        """
+        :param top: *Optional:* number of entries to return
+        :param sort: attribute of :class:`FixtureStats` to sort by, descending
+        :return: list of :class:`FixtureStats`
+        """
+        stats = sorted(self.stats.values(), key=lambda s: getattr(s, sort), reverse=True)
+        return stats[:top] if top is not None else stats
+
+    def format_report(self, top=10, sort='seconds'):
+        """
+        :return: the :meth:`report` as text table
+        """
+        lines = ['%-40s %-7s %8s %10s %8s %10s' % ('fixture', 'method', 'calls', 'seconds', 'flushes', 'statements')]
+        for s in self.report(top, sort):
+            name = '%s.%s' % (s.fixture.__module__, s.fixture.__name__)
+            lines.append('%-40s %-7s %8d %10.3f %8d %10d' % (name[-40:], s.method, s.calls, s.seconds, s.flushes,
+                                                            s.statements))
+        return '\n'.join(lines)
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+Inserts whole fixture scenarios with bulk statements per table
+"""
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import inspect
+from sqlalchemy.orm.interfaces import MANYTOONE
+from sqlalchemy.schema import sort_tables
+
+from sqlalchemy_fixture_factory.sqla_fix_fact import SubFactory, METHOD_GET, METHOD_CREATE, registry_key, \
+    _bulk_insert, _load_by_pk
+
+
+def materialize(fix_fact, roots, pk_only=False):
+    """
+    Builds the given fixtures including all references and inserts them with bulk statements.
+
+    First the roots are expanded into the graph of all referenced fixtures. Fixtures referenced via
+    :func:`.subFactoryGet` are part of the graph only once and are registered like with :meth:`.BaseFix.get`; already
+    registered ones are reused. Then the graph is inserted table by table in the order of the foreign keys, with one
+    bulk statement per table (only tables referencing themselves need more). Missing integer primary keys are assigned
+    up front, like with :meth:`.BaseFix.create_batch`. Foreign keys are filled in from the inserted primary keys. Rows
+    of association tables (``secondary``) are inserted at the end, again one executemany per table.
+
+    Fixtures referenced via get which declare ``LOOKUP`` columns are searched in the DB first, all of the graph with one
+    query per model (see :meth:`.SqlaFixFact.lookup`). Only the missing ones are inserted.
+
+    Fixtures which can not be expressed as plain rows (a custom ``update()`` method or hybrid properties) are built
+    the regular way in advance.
+
+    :param fix_fact: instance of :class:`.SqlaFixFact`
+    :param roots: fixture instance or sub-factory, or a list of them. Fixture instances are created like with
+        :meth:`.BaseFix.create`, sub-factories according to their method (``model`` is created as well)
+    :param pk_only: if ``True`` only the primary keys of the roots are returned
+    :return: SQLAlchemy Model instance or primary key for each root, a list if ``roots`` is a list
+    """
+    single = not isinstance(roots, (list, tuple))
+    if single:
+        roots = [roots]
+
+    fixtures = [(root.fixture(fix_fact, **root.kwargs), root.method) if isinstance(root, SubFactory)
+                else (root, METHOD_CREATE) for root in roots]
+
+    graph = _Graph(fix_fact)
+    with fix_fact._searching():
+        # existing rows of fixtures with lookup columns are searched at once, see :meth:`.SqlaFixFact.lookup`
+        fix_fact._search(fixtures)
+        targets = [graph.add(fixture, method) for fixture, method in fixtures]
+
+    graph.insert()
+
+    if pk_only:
+        result = [graph.pk(target) for target in targets]
+    else:
+        result = graph.load(targets)
+    return result[0] if single else result
+
+
+class _Node(object):
+    """
+    A fixture of the graph which is inserted as plain row
+    """
+    __slots__ = ('plan', 'key', 'values', 'sources', 'dependents', 'waiting')
+
+    def __init__(self, plan, key):
+        self.plan = plan
+        # registry key, if built via get
+        self.key = key
+        # row to insert, the primary key is set after the insert
+        self.values = {}
+        # nodes or instances the foreign keys are taken from: (source, [(source key, key)])
+        self.sources = []
+        self.dependents = []
+        self.waiting = 0
+
+
+class _Graph(object):
+
+    def __init__(self, fix_fact):
+        self.fix_fact = fix_fact
+        self.db_session = fix_fact.get_db_session()
+        self.nodes = []
+        self.registered = {}
+        self.existing = []
+        # rows of association tables: (relationship, parent, child)
+        self.associations = []
+        # foreign keys to set on instances which are already in the session: (instance, source, pairs)
+        self.updates = []
+
+    def add(self, fixture, method):
+        """
+        Adds the fixture with all its references to the graph.
+
+        :return: the node of the fixture, or the model instance if it was built the regular way
+        """
+        plan = fixture._plan
+        key = None
+        if method == METHOD_GET:
+            key = registry_key(fixture.__class__, fixture._kwargs)
+            if key in self.registered:
+                return self.registered[key]
+            # all fixtures of the graph built via get were searched in the DB already
+            if key in self.fix_fact.instances:
+                return self._existing(fixture.get())
+
+        attrs = fixture.getRawAttributes()
+        if plan.use_update or not all(k in plan.column_keys or k in plan.relationships for k in attrs):
+            return self._existing(fixture.get() if method == METHOD_GET else fixture.create())
+
+        node = _Node(plan, key)
+        self.nodes.append(node)
+        if key is not None:
+            self.registered[key] = node
+
+        for attr_key, value in attrs.items():
+            rel = plan.relationships.get(attr_key)
+            if rel is None:
+                node.values[attr_key] = value
+                continue
+
+            try:
+                values = list(value)
+            except TypeError as e:
+                # not a list, a single reference
+                values = [value]
+
+            for v in values:
+                if isinstance(v, SubFactory):
+                    target = self.add(v.fixture(self.fix_fact, **v.kwargs), v.method)
+                else:
+                    target = self._existing(v)
+
+                if rel.secondary is not None:
+                    self.associations.append((rel, node, target))
+                elif rel.direction is MANYTOONE:
+                    self._link(target, node, _sync_pairs(rel))
+                else:
+                    self._link(node, target, _sync_pairs(rel))
+
+        return node
+
+    def _existing(self, instance):
+        self.existing.append(instance)
+        return instance
+
+    def _link(self, source, dest, pairs):
+        if not isinstance(dest, _Node):
+            self.updates.append((dest, source, pairs))
+            return
+
+        dest.sources.append((source, pairs))
+        if isinstance(source, _Node):
+            source.dependents.append(dest)
+            dest.waiting += 1
+
+    def insert(self):
+        # instances which are referenced need their primary keys
+        pending = False
+        for instance in self.existing:
+            if inspect(instance).key is None:
+                self.db_session.add(instance)
+                pending = True
+        if pending:
+            self.fix_fact.flush(force=True)
+
+        models = set(node.plan.model for node in self.nodes)
+        tables = sort_tables(set(inspect(model).local_table for model in models))
+        order = dict((model, tables.index(inspect(model).local_table)) for model in models)
+
+        ready = {}
+        for node in self.nodes:
+            if not node.waiting:
+                ready.setdefault(node.plan.model, []).append(node)
+
+        inserted = 0
+        while ready:
+            model = min(ready, key=order.get)
+            group = ready.pop(model)
+
+            for node in group:
+                for source, pairs in node.sources:
+                    for source_key, key in pairs:
+                        node.values[key] = _value(source, source_key)
+            _bulk_insert(self.db_session, group[0].plan, [node.values for node in group])
+            inserted += len(group)
+
+            for node in group:
+                for dependent in node.dependents:
+                    dependent.waiting -= 1
+                    if not dependent.waiting:
+                        ready.setdefault(dependent.plan.model, []).append(dependent)
+
+        if inserted < len(self.nodes):
+            raise ValueError('Fixtures with cyclic references can not be materialized')
+
+        rows = {}
+        for rel, parent, child in self.associations:
+            row = {}
+            for source_key, key in _secondary_pairs(rel)[0]:
+                row[key] = _value(parent, source_key)
+            for source_key, key in _secondary_pairs(rel)[1]:
+                row[key] = _value(child, source_key)
+            rows.setdefault(rel.secondary, []).append(row)
+            if not isinstance(parent, _Node):
+                # the collection of this instance has changed in the DB
+                self.db_session.expire(parent, [rel.key])
+        for table, table_rows in rows.items():
+            self.db_session.execute(table.insert(), table_rows)
+
+        if self.updates:
+            for instance, source, pairs in self.updates:
+                for source_key, key in pairs:
+                    setattr(instance, key, _value(source, source_key))
+            self.fix_fact.flush(force=True)
+
+    def pk(self, target):
+        if isinstance(target, _Node):
+            return target.plan.pk_from_mapping(target.values)
+        pk = inspect(target).mapper.primary_key_from_instance(target)
+        return pk[0] if len(pk) == 1 else tuple(pk)
+
+    def load(self, targets):
+        """
+        Loads the instances of the targets and of all nodes built via get, which are registered.
+        """
+        nodes = [t for t in targets if isinstance(t, _Node)] + [n for n in self.registered.values()]
+
+        pks = {}
+        for node in nodes:
+            pks.setdefault(node.plan.model, set()).add(node.plan.pk_from_mapping(node.values))
+
+        loaded = {}
+        for model, model_pks in pks.items():
+            plan = next(n.plan for n in nodes if n.plan.model is model)
+            model_pks = list(model_pks)
+            for pk, instance in zip(model_pks, _load_by_pk(self.db_session, model, plan, model_pks)):
+                loaded[(model, pk)] = instance
+
+        def instance_of(target):
+            if isinstance(target, _Node):
+                return loaded[(target.plan.model, target.plan.pk_from_mapping(target.values))]
+            return target
+
+        for key, node in self.registered.items():
+            self.fix_fact.instances[key] = instance_of(node)
+
+        return [instance_of(t) for t in targets]
+
+
+def _value(source, key):
+    if isinstance(source, _Node):
+        return source.values[key]
+    return getattr(source, key)
+
+
+_pairs = WeakKeyDictionary()
+
+
+def _sync_pairs(rel):
+    """
+    :return: list of (source key, destination key) for the attributes which are copied along the relationship.
+        The source is the referenced side for many-to-one, otherwise the parent.
+    """
+    pairs = _pairs.get(rel)
+    if pairs is None:
+        if rel.direction is MANYTOONE:
+            source_mapper, dest_mapper = rel.mapper, rel.parent
+        else:
+            source_mapper, dest_mapper = rel.parent, rel.mapper
+        pairs = [(source_mapper.get_property_by_column(source).key, dest_mapper.get_property_by_column(dest).key)
+                 for source, dest in rel.synchronize_pairs]
+        _pairs[rel] = pairs
+    return pairs
+
+
+def _secondary_pairs(rel):
+    """
+    :return: lists of (source key, column key) for the parent and for the child side of an association table
+    """
+    pairs = _pairs.get(rel)
+    if pairs is None:
+        pairs = ([(rel.parent.get_property_by_column(source).key, dest.key) for source, dest in rel.synchronize_pairs],
+                 [(rel.mapper.get_property_by_column(source).key, dest.key)
+                  for source, dest in rel.secondary_synchronize_pairs])
+        _pairs[rel] = pairs
+    return pairs
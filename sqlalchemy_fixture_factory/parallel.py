@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+Generation of row payloads in a process pool, for big seeds with CPU-bound attributes
+"""
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer
+
+from sqlalchemy import func
+
+from sqlalchemy_fixture_factory.sqla_fix_fact import StreamProgress
+
+
+def stream_parallel(fixture, total, payload, chunk_size=1000, workers=None, seed=0, commit=True, executor=None):
+    """
+    Generator which inserts ``total`` rows of a fixture like :meth:`.BaseFix.stream` with ``core=True``, while the
+    expensive attributes of the rows are generated in a pool of processes.
+
+    ``payload(index, random)`` is called in the worker processes for every row and returns a dict of key words to
+    overwrite properties of the fixture, like the ``overrides`` of :meth:`.BaseFix.create_batch`. It gets the index of
+    the row within ``total`` and a ``random.Random`` seeded per chunk, so the rows do not depend on the number of
+    processes. It has to be picklable, i.e. a function defined at module level.
+
+    The chunks are inserted by this process, in order, as soon as they are generated. Integer primary keys are assigned
+    up front from the max. key in the table (unless the factory is sharded, see :class:`.SqlaFixFact`), so the chunks
+    can be built independently of the DB.
+
+    :param fixture: instance of a fixture class, its ``kwargs`` apply to all rows
+    :param total: number of rows to insert
+    :param payload: picklable callable generating the key words of one row
+    :param chunk_size: *Optional:* number of rows per chunk, generated by a single task
+    :param workers: *Optional:* number of processes, the number of CPUs by default
+    :param seed: *Optional:* seed of the random numbers, combined with the worker of the factory and the chunk
+    :param commit: if ``False`` the chunks are only flushed, e.g. to roll them back at the end of a test
+    :param executor: *Optional:* ``concurrent.futures.Executor`` to use instead of a new process pool
+    :return: generator of :class:`.StreamProgress`, one per chunk
+    """
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be positive: %r' % chunk_size)
+
+    fix_fact = fixture._fix_fact
+    plan = fixture._plan
+    db_session = fix_fact.get_db_session()
+
+    first_pk = None
+    if plan.shard_pk_key and not fix_fact.is_sharded() and plan.shard_pk_key not in fixture._kwargs:
+        first_pk = (db_session.query(func.max(getattr(plan.model, plan.shard_pk_key))).scalar() or 0) + 1
+
+    chunks = iter(enumerate(range(0, total, chunk_size)))
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(workers)
+
+    # a bounded number of chunks is in flight, the results are inserted in order
+    pending = deque()
+
+    def submit():
+        for i, offset in chunks:
+            pending.append(executor.submit(_generate, payload, offset, min(chunk_size, total - offset),
+                                           '%d:%d:%d' % (seed, fix_fact.worker, i)))
+            return
+
+    start = default_timer()
+    try:
+        for _ in range(2 * (workers or os.cpu_count() or 1)):
+            submit()
+
+        while pending:
+            offset, rows = pending.popleft().result()
+            submit()
+
+            pks = None
+            if first_pk is not None:
+                for i, row in enumerate(rows):
+                    row.setdefault(plan.shard_pk_key, first_pk + offset + i)
+                pks = [row[plan.shard_pk_key] for row in rows]
+
+            fixture.insert(len(rows), rows)
+            if commit:
+                db_session.commit()
+            else:
+                fix_fact.flush(force=True)
+
+            yield StreamProgress(offset + len(rows), total, pks, default_timer() - start)
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown()
+
+
+def _generate(payload, offset, n, seed):
+    """
+    Task of a worker process: generates the key words of the rows of a chunk.
+    """
+    rnd = random.Random(seed)
+    return offset, [payload(offset + i, rnd) or {} for i in range(n)]
+
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+pytest plugin providing a :class:`.SqlaFixFact` per test, rolled back to a SAVEPOINT at teardown.
+
+The whole test session runs in one transaction of a single connection, which is rolled back at the end. Each module and
+each test gets a nested transaction (SAVEPOINT) and a layer of the fixture registry on top, see
+:meth:`.SqlaFixFact.nested`. Fixtures built with ``get()`` in module or session scoped fixtures thus survive across the
+tests of this scope, while everything built within a test is discarded by rolling back its SAVEPOINT, even if the test
+commits the session.
+
+Fixtures:
+
+* ``fix_fact_engine``: *session scope*, the engine to use. Either override it or set the ini option ``fix_fact_url``
+* ``fix_fact_global``: *session scope*, the :class:`.SqlaFixFact` instance
+* ``fix_fact_module``: *module scope*, the :class:`.SqlaFixFact` instance within the SAVEPOINT of the module
+* ``fix_fact``: the :class:`.SqlaFixFact` instance within the SAVEPOINT of the test
+
+With pytest-xdist, the factory of each worker is sharded (see :class:`.SqlaFixFact`), so the workers can seed a shared DB
+in parallel. The ini option ``fix_fact_seed`` sets the seed of the random numbers.
+
+``--fix-fact-report=N`` instruments the factory (see :meth:`.SqlaFixFact.instrument`) and prints the N fixtures which took
+the most time in the terminal summary.
+"""
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_fixture_factory.sqla_fix_fact import SqlaFixFact
+
+
+def pytest_addoption(parser):
+    parser.addoption('--fix-fact-report', type=int, metavar='N',
+                     help='report the N fixtures of the SQLAlchemy fixture factory which took the most time')
+    parser.addini('fix_fact_url', 'DB URL for the engine of the SQLAlchemy fixture factory')
+    parser.addini('fix_fact_seed', 'Seed for the random numbers of the SQLAlchemy fixture factory', default='0')
+
+
+@pytest.fixture(scope='session')
+def fix_fact_engine(request):
+    url = request.config.getini('fix_fact_url')
+    if not url:
+        pytest.fail('Either set the ini option "fix_fact_url" or override the fixture "fix_fact_engine"')
+
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def fix_fact_global(request, fix_fact_engine):
+    connection = fix_fact_engine.connect()
+    transaction = connection.begin()
+    db_session = sessionmaker(bind=connection)()
+
+    # set by pytest-xdist, e.g. "gw3"
+    worker = os.environ.get('PYTEST_XDIST_WORKER')
+    fix_fact = SqlaFixFact(db_session,
+                           worker=int(worker[2:]) if worker else 0,
+                           workers=int(os.environ.get('PYTEST_XDIST_WORKER_COUNT', 1)),
+                           seed=int(request.config.getini('fix_fact_seed')))
+    if request.config.getoption('fix_fact_report'):
+        request.config._fix_fact_instrumentation = fix_fact.instrument()
+
+    yield fix_fact
+
+    db_session.close()
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture(scope='module')
+def fix_fact_module(fix_fact_global):
+    with fix_fact_global.nested():
+        yield fix_fact_global
+
+
+@pytest.fixture
+def fix_fact(fix_fact_module):
+    with fix_fact_module.nested():
+        yield fix_fact_module
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    instrumentation = getattr(config, '_fix_fact_instrumentation', None)
+    if instrumentation is not None:
+        terminalreporter.write_sep('=', 'slowest SQLAlchemy fixtures')
+        terminalreporter.write_line(instrumentation.format_report(config.getoption('fix_fact_report')))
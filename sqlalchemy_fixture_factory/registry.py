@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+Registries of the fixtures built with :meth:`.BaseFix.get`, see the ``registry`` option of :class:`.SqlaFixFact`
+"""
+import sys
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from sqlalchemy import inspect
+
+# min. number of pending entries before they are checked for primary keys on insert, see :class:`IdentityRegistry`
+SETTLE_MIN_PENDING = 64
+
+
+class IdentityRegistry(MutableMapping):
+    """
+    Registry which stores the identity key (class and primary key) of each instance instead of the instance itself.
+
+    The instances are looked up in the identity map of the session, which holds them only weakly. If an instance was
+    garbage collected in the meantime, it is loaded again from the DB. If its row is gone (e.g. rolled back), the entry
+    is dropped and the fixture is built again by the next ``get()``.
+
+    Pending instances (within :meth:`.SqlaFixFact.batch`) have no primary key yet, they are kept until they are accessed
+    after they were flushed, or until the number of pending entries has doubled since they were last checked.
+
+    With ``max_size`` the registry keeps only the most recently used entries. Note that ``get()`` builds an evicted
+    fixture again, as a new row.
+    """
+
+    def __init__(self, db_session, max_size=None):
+        """
+        :param db_session: SQLAlchemy DB session, the same as the one of :class:`.SqlaFixFact`
+        :param max_size: *Optional:* max. number of entries
+        """
+        assert max_size is None or max_size > 0, 'max_size must be positive'
+        self.db_session = db_session
+        self.max_size = max_size
+        # registry key -> identity key, or the instance while it is pending
+        self._entries = OrderedDict()
+        # keys of the pending instances
+        self._pending = set()
+        # number of pending entries at which all of them are checked again, see :meth:`__setitem__`
+        self._settle_at = SETTLE_MIN_PENDING
+
+    def __getitem__(self, key):
+        if key in self._pending:
+            self._settle_key(key)
+        value = self._entries[key]
+        if isinstance(value, tuple):
+            instance = self.db_session.identity_map.get(value)
+            if instance is None:
+                instance = self.db_session.query(value[0]).get(value[1])
+            if instance is None:
+                del self._entries[key]
+                raise KeyError(key)
+        else:
+            instance = value
+
+        self._touch(key)
+        return instance
+
+    def __setitem__(self, key, instance):
+        identity_key = inspect(instance).identity_key
+        self._entries[key] = identity_key or instance
+        if identity_key is None:
+            self._pending.add(key)
+            if len(self._pending) >= self._settle_at:
+                # amortized: the pending entries are checked again only once their number has doubled
+                self._settle()
+                self._settle_at = max(SETTLE_MIN_PENDING, 2 * len(self._pending))
+        else:
+            self._pending.discard(key)
+        self._touch(key)
+
+        if self.max_size is not None:
+            while len(self._entries) > self.max_size:
+                self._pending.discard(self._entries.popitem(last=False)[0])
+
+    def __delitem__(self, key):
+        del self._entries[key]
+        self._pending.discard(key)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _settle(self):
+        """
+        Replaces the pending instances which got flushed in the meantime by their identity keys.
+        """
+        for key in list(self._pending):
+            self._settle_key(key)
+
+    def _settle_key(self, key):
+        identity_key = inspect(self._entries[key]).identity_key
+        if identity_key is not None:
+            self._entries[key] = identity_key
+            self._pending.discard(key)
+
+    def _touch(self, key):
+        self._entries.move_to_end(key)
+
+    def rebind(self, db_session):
+        """
+        Looks up the instances in ``db_session`` from now on. Pending instances of the old session are dropped.
+        """
+        self._settle()
+        for key in self._pending:
+            del self._entries[key]
+        self._pending.clear()
+        self.db_session = db_session
+
+    def copy(self):
+        """
+        :return: registry with the same entries and options, used for nested scopes
+        """
+        registry = self.__class__(self.db_session, self.max_size)
+        registry._entries = OrderedDict(self._entries)
+        registry._pending = set(self._pending)
+        registry._settle_at = self._settle_at
+        return registry
+
+    def clear(self):
+        self._entries.clear()
+        self._pending.clear()
+        self._settle_at = SETTLE_MIN_PENDING
+
+
+def memory_size(registry):
+    """
+    Approximates the memory used by a registry: the mapping, its keys and the values it stores. Fixture and model
+    classes are not counted, instances are counted with their attribute dict but without the objects they reference.
+
+    :param registry: :attr:`.SqlaFixFact.instances`, a ``dict`` or an :class:`IdentityRegistry`
+    :return: size in bytes
+    """
+    seen = set()
+    if isinstance(registry, IdentityRegistry):
+        registry._settle()
+        return sys.getsizeof(registry) + _deep_size(registry._entries, seen)
+    return _deep_size(registry, seen)
+
+
+def _deep_size(value, seen):
+    if id(value) in seen or isinstance(value, type):
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (tuple, list, set, frozenset)):
+        size += sum(_deep_size(v, seen) for v in value)
+    elif hasattr(value, '__dict__'):
+        # a model instance or a sub-factory without slots
+        size += sys.getsizeof(vars(value))
+    elif hasattr(value, '__slots__'):
+        size += sum(_deep_size(getattr(value, name, None), seen) for name in value.__slots__)
+    return size
@@ -5,46 +5,505 @@
 """
 Fixture Factory for SQLAlchemy
 """
-from sqlalchemy import inspect
+import functools
+import random
+import sqlite3
+from contextlib import contextmanager
+from timeit import default_timer
+
+from sqlalchemy import Integer, event, func, inspect, text, tuple_
 from sqlalchemy.ext import hybrid
 from sqlalchemy.orm import class_mapper
+from sqlalchemy.orm.attributes import ATTR_WAS_SET, NON_PERSISTENT_OK, PASSIVE_NO_RESULT, SQL_OK
+from sqlalchemy.orm.interfaces import MANYTOONE
+
+from sqlalchemy_fixture_factory.instrumentation import Instrumentation
+from sqlalchemy_fixture_factory.registry import IdentityRegistry
 
 METHOD_MODEL = 'model'
 METHOD_CREATE = 'create'
 METHOD_GET = 'get'
 
+# max. number of bound parameters used in a single "IN" clause when loading instances by primary key
+IN_CHUNK_SIZE = 500
+
+# primary keys assigned by a sharded factory start at this offset within the range of the worker, keys declared in
+# fixtures should stay below it, see :class:`SqlaFixFact`
+EXPLICIT_PK_RANGE = 10000
+
 class SqlaFixFact():
     """
     Fixture factory manager
+
+    To seed one DB from several workers in parallel (e.g. with pytest-xdist), pass the ``worker`` number and the
+    number of ``workers``. Each worker then gets a disjoint range of ``shard_size`` integer primary keys and the rows
+    without a declared key get their keys from it, continuing behind the max. key of the range in the DB, so the
+    workers never collide, neither with each other nor with rows of earlier runs. Keys and foreign keys declared in
+    fixtures are used as written: keep them below :data:`EXPLICIT_PK_RANGE` or move them into the range of the worker
+    with :meth:`shard_pk`. :attr:`random` is seeded per worker, for deterministic random values in fixtures.
+
+    With ``lazy=True`` references to other fixtures of :meth:`.BaseFix.model` (and thus ``create()`` and ``get()``)
+    are resolved only when the relationship is read for the first time, even if the instance was committed or expired
+    in the meantime. References with a NOT NULL foreign key are resolved at the latest when the instance is flushed.
+    Optional references which are never read stay empty.
+
+    The instances built with :meth:`.BaseFix.get` are registered in :attr:`instances`, by default a ``dict`` holding
+    them. Pass an :class:`.IdentityRegistry` as ``registry`` to keep only their primary keys, optionally bounded.
     """
     db_session = None
     instances = None
+    random = None
+    instrumentation = None
+    _batch_depth = 0
+    _search_depth = 0
 
-    def __init__(self, db_session):
+    def __init__(self, db_session, worker=0, workers=1, seed=0, shard_size=10 ** 7, lazy=False,
+                 registry=None):
+        """
+        :param db_session: SQLAlchemy DB session
+        :param worker: *Optional:* number of this worker, from ``0`` to ``workers - 1``
+        :param workers: *Optional:* number of workers seeding the same DB
+        :param seed: *Optional:* seed of :attr:`random`, combined with the worker number
+        :param shard_size: *Optional:* number of primary keys per worker and table
+        :param lazy: *Optional:* resolve references to other fixtures on first access
+        :param registry: *Optional:* empty mapping for the registered fixtures, e.g. an :class:`.IdentityRegistry`
+        """
         assert db_session, 'Passed in DB session is None!'
+        assert 0 <= worker < workers, 'Worker number must be between 0 and %d' % (workers - 1)
         self.db_session = db_session
-        self.instances = {}
+        self.instances = registry if registry is not None else {}
+        self.worker = worker
+        self.workers = workers
+        self.shard_size = shard_size
+        self.random = random.Random('%d:%d' % (seed, worker))
+        self._next_pks = {}
+        # registry keys of fixtures which were searched in the DB and not found, see :meth:`_searching`
+        self._searched = set()
+        self.lazy = lazy
+        if lazy:
+            event.listen(db_session, 'before_flush', self._resolve_required_references)
+
+    def is_sharded(self):
+        """
+        :return: ``True`` if primary keys are assigned from the range of this worker
+        """
+        return self.workers > 1
+
+    def shard_pk(self, pk):
+        """
+        Moves a primary key into the range of this worker, e.g. for a key passed as key word:
+        ``FixAccount(fix_fact, id=fix_fact.shard_pk(1))``. Declared keys are not moved automatically.
+
+        :param pk: integer primary key, below :data:`EXPLICIT_PK_RANGE`
+        :return: primary key of this worker
+        """
+        if not 0 < pk < EXPLICIT_PK_RANGE:
+            raise ValueError('Primary keys of sharded fixtures must be between 1 and %d: %r'
+                             % (EXPLICIT_PK_RANGE - 1, pk))
+        return self.worker * self.shard_size + pk
+
+    def next_pk(self, table):
+        """
+        Returns the next primary key of this worker for a new row in ``table``. The first key is behind the max. key of
+        the range of the worker in ``table``.
+        """
+        pk = self._next_pks.get(table)
+        if pk is None:
+            column = table.primary_key.columns.values()[0]
+            first_pk = self.worker * self.shard_size + EXPLICIT_PK_RANGE
+            # pending instances of a batch must not be flushed by the query
+            with self.db_session.no_autoflush:
+                max_pk = self.db_session.query(func.max(column)).filter(
+                    column >= first_pk, column < (self.worker + 1) * self.shard_size).scalar()
+            pk = EXPLICIT_PK_RANGE if max_pk is None else max_pk + 1 - self.worker * self.shard_size
+        if pk >= self.shard_size:
+            raise ValueError('Primary keys of worker %d for table %s are exhausted' % (self.worker, table))
+        self._next_pks[table] = pk + 1
+        return self.worker * self.shard_size + pk
 
     def get_db_session(self):
         return self.db_session
 
+    @contextmanager
+    def batch(self):
+        """
+        Context manager which defers the flushes of :meth:`.BaseFix.get` and :meth:`.BaseFix.create` until the end of
+        the block, so a whole scenario is written with a single flush.
+
+        Within the block the returned instances are pending, they get their primary keys at the flush at the end of
+        the block, by the autoflush of a query or by an explicit :meth:`flush`. Blocks can be nested, the outermost one
+        flushes.
+
+        If the block raises, the instances which were added within it and are still pending are removed from the
+        session and the fixtures registered within it are unregistered. Rows flushed within the block already stay in
+        the transaction, use :meth:`nested` to roll them back as well.
+        """
+        new = set(self.db_session.new)
+        instances = self.instances.copy()
+        try:
+            with self._deferred():
+                yield self
+        except BaseException:
+            for inst in list(self.db_session.new):
+                if inst not in new:
+                    self.db_session.expunge(inst)
+            self.instances = instances
+            raise
+        if not self._batch_depth:
+            self.db_session.flush()
+
+    @contextmanager
+    def _deferred(self):
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+
+    @contextmanager
+    def _searching(self):
+        """
+        Keeps the registry keys of the fixtures which were not found by :meth:`_search` until the end of the outermost
+        block, so they are not searched again while they are built.
+        """
+        self._search_depth += 1
+        try:
+            yield
+        finally:
+            self._search_depth -= 1
+            if not self._search_depth:
+                self._searched.clear()
+
+    @contextmanager
+    def nested(self):
+        """
+        Context manager for a nested scope. A SAVEPOINT is set at the beginning of the block and rolled back at the
+        end, together with all fixtures registered within the block. Fixtures registered before stay registered.
+
+        A ``commit()`` of the session within the block can not end the scope: it only releases an inner SAVEPOINT,
+        which is opened again right away, thus the rows stay within the SAVEPOINT of the scope.
+
+        Used by the pytest plugin to layer module and test scopes, see :mod:`.pytest_plugin`.
+        """
+        transaction = self.db_session.begin_nested()
+        # released by commits within the block instead of the SAVEPOINT of the scope
+        guard = [self.db_session.begin_nested()]
+
+        def reopen_guard(db_session, ended):
+            if ended is guard[0]:
+                guard[0] = db_session.begin_nested()
+
+        event.listen(self.db_session, 'after_transaction_end', reopen_guard)
+        instances = self.instances
+        self.instances = instances.copy()
+        try:
+            yield self
+        finally:
+            event.remove(self.db_session, 'after_transaction_end', reopen_guard)
+            if transaction.is_active:
+                transaction.rollback()
+            self.instances = instances
+
+    def in_batch(self):
+        """
+        :return: ``True`` if flushes are deferred by :meth:`batch`
+        """
+        return self._batch_depth > 0
+
+    def flush(self, force=False):
+        """
+        Flushes the DB session, unless flushes are deferred by :meth:`batch`.
+
+        :param force: flush even within a :meth:`batch` block, e.g. because primary keys are needed
+        """
+        if force or not self._batch_depth:
+            self.db_session.flush()
+
     def merge(self, instance, Fixture, kwargs):
         assert self.db_session, 'DB session not initialized yet'
-        inst = self.db_session.merge(instance)
-        self.db_session.flush()
+        if self._batch_depth and inspect(instance).transient:
+            # a new instance, no need to look it up in the DB
+            self.db_session.add(instance)
+            inst = instance
+        else:
+            inst = self.db_session.merge(instance)
+            _copy_lazy_references(instance, inst)
+        self.flush()
 
-        self.instances[(Fixture.__name__, str(kwargs))] = inst
+        self.instances[registry_key(Fixture, kwargs)] = inst
 
         return inst
 
+    def instrument(self):
+        """
+        Starts recording calls, wall time, flushes and SQL statements per fixture class and method.
+
+        :return: :class:`.Instrumentation` instance with the statistics, also available as :attr:`instrumentation`
+        """
+        if self.instrumentation is None:
+            self.instrumentation = Instrumentation(self.db_session)
+        return self.instrumentation
+
+    def uninstrument(self):
+        """
+        Stops recording started by :meth:`instrument`.
+
+        :return: :class:`.Instrumentation` instance with the statistics recorded so far
+        """
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.detach()
+            self.instrumentation = None
+        return instrumentation
+
     def get(self, Fixture, **kwargs):
-        inst = self.instances.get((Fixture.__name__, str(kwargs)))
+        if self.instrumentation is None:
+            return self._get(Fixture, kwargs)
+        with self.instrumentation.measure(Fixture, METHOD_GET):
+            return self._get(Fixture, kwargs)
+
+    def _get(self, Fixture, kwargs):
+        key = registry_key(Fixture, kwargs)
+        inst = self.instances.get(key)
 
-        if not inst:
-            inst = Fixture(self, **kwargs).model()
+        if inst is None:
+            with self._searching():
+                fixture = Fixture(self, **kwargs)
+                if key not in self._searched:
+                    # the rows of this fixture and of the ones it references via get are searched at once
+                    self._search([(fixture, METHOD_GET)])
+                    inst = self.instances.get(key)
+                if inst is None:
+                    return self.merge(fixture.model(), Fixture, kwargs)
 
+        if inst in self.db_session:
+            # still attached to the current session, nothing to merge or to flush
+            return inst
         return self.merge(inst, Fixture, kwargs)
 
+    def _search(self, roots):
+        """
+        Searches the rows of the fixtures which are built via get by the ``(fixture, method)`` pairs of ``roots`` and
+        their references, with :meth:`lookup`. To be used within a :meth:`_searching` block.
+        """
+        fixtures = _reachable_gets(self, roots)
+        self.lookup(fixtures)
+        self._searched.update(registry_key(fixture.__class__, fixture._kwargs) for fixture in fixtures)
+
+    def lookup(self, fixtures):
+        """
+        Registers existing rows for fixtures which declare ``LOOKUP`` columns (see :class:`.BaseFix`), so
+        :meth:`.BaseFix.get` returns them instead of building new ones. The rows are searched with one
+        ``WHERE ... IN (...)`` query per model and :data:`IN_CHUNK_SIZE` fixtures.
+
+        Fixtures which are registered already or do not declare ``LOOKUP`` columns are skipped. Used by
+        :meth:`.BaseFix.get` and by :func:`.materialize` for the fixture and all fixtures it references via get, which
+        build the missing ones. Within a :meth:`batch` block the queries do not flush the session.
+
+        :param fixtures: fixture instances or sub-factories
+        :return: number of fixtures found in the DB
+        """
+        by_lookup = {}
+        for fixture in fixtures:
+            if isinstance(fixture, SubFactory):
+                fixture = fixture.fixture(self, **fixture.kwargs)
+            if not fixture.LOOKUP:
+                continue
+            key = registry_key(fixture.__class__, fixture._kwargs)
+            if key in self.instances:
+                continue
+            plan = fixture._plan
+            by_lookup.setdefault((plan.model, plan.lookup_keys), {}).setdefault(fixture._lookupValues(), []).append(key)
+
+        found = 0
+        for (model, lookup_keys), keys_by_values in by_lookup.items():
+            if len(lookup_keys) == 1:
+                expr = getattr(model, lookup_keys[0])
+                values = [v[0] for v in keys_by_values]
+            else:
+                expr = tuple_(*[getattr(model, key) for key in lookup_keys])
+                values = list(keys_by_values)
+
+            for i in range(0, len(values), IN_CHUNK_SIZE):
+                query = self.db_session.query(model).autoflush(not self._batch_depth)
+                for inst in query.filter(expr.in_(values[i:i + IN_CHUNK_SIZE])):
+                    for key in keys_by_values.get(tuple(getattr(inst, k) for k in lookup_keys), ()):
+                        self.instances[key] = inst
+                        found += 1
+        return found
+
+    def _resolve_required_references(self, db_session, flush_context, instances):
+        """
+        Listener of ``before_flush``: resolves lazy references with NOT NULL foreign keys of new instances. The
+        instances created thereby are added to the session and are part of this flush.
+        """
+        with self._deferred():
+            resolved = True
+            while resolved:
+                resolved = False
+                for instance in list(db_session.new):
+                    state = inspect(instance)
+                    for reference in _lazy_references(state):
+                        if reference.required:
+                            reference.resolve(state)
+                            resolved = True
+
+    def snapshot(self):
+        """
+        Takes a snapshot of the DB and of the registered fixtures, to be restored later with :meth:`restore`.
+
+        The session is committed and the DB is copied into memory with the SQLite backup API, thus this is only
+        supported for SQLite (file or in-memory DB).
+
+        :return: :class:`.Snapshot` instance
+        """
+        self.db_session.commit()
+
+        copy = sqlite3.connect(':memory:', check_same_thread=False)
+        _sqlite_connection(self.db_session).backup(copy)
+
+        identities = dict((key, inspect(inst).identity) for key, inst in self.instances.items())
+        return Snapshot(copy, identities)
+
+    def rebind(self, db_session, lazy=False):
+        """
+        Moves this factory to another session, e.g. a new one per test on the same seeded DB. The registered fixtures
+        are carried over: their instances are loaded in ``db_session`` with one query per model and
+        :data:`IN_CHUNK_SIZE` instances. Fixtures whose rows do not exist for ``db_session`` (e.g. not committed) and
+        instances without primary key are dropped from the registry.
+
+        With ``lazy=True`` nothing is loaded, the registry is replaced by an :class:`.IdentityRegistry` which loads
+        the instances on first use. An :class:`.IdentityRegistry` is always rebound lazily.
+
+        Not to be used within a :meth:`nested` block.
+
+        :param db_session: SQLAlchemy DB session
+        :param lazy: *Optional:* load the registered instances on first use
+        """
+        assert db_session, 'Passed in DB session is None!'
+        if self.lazy:
+            event.remove(self.db_session, 'before_flush', self._resolve_required_references)
+            event.listen(db_session, 'before_flush', self._resolve_required_references)
+        if self.instrumentation is not None:
+            self.instrumentation.detach()
+            self.instrumentation.attach(db_session)
+
+        self.db_session = db_session
+        if isinstance(self.instances, IdentityRegistry):
+            self.instances.rebind(db_session)
+            return
+
+        identities = {}
+        for key, inst in self.instances.items():
+            identity_key = inspect(inst).identity_key
+            if identity_key is not None:
+                identities[key] = identity_key
+
+        if lazy:
+            self.instances = IdentityRegistry(db_session)
+            self.instances._entries.update(identities)
+        else:
+            self.instances.clear()
+            self._load_registry(dict((key, identity_key[1]) for key, identity_key in identities.items()))
+
+    def _load_registry(self, identities):
+        """
+        Registers the instances of registry key -> primary key tuple, loaded with one query per model. Missing rows
+        are skipped.
+        """
+        by_model = {}
+        for key, identity in identities.items():
+            by_model.setdefault(key[0].MODEL, []).append((key, identity[0] if len(identity) == 1 else identity))
+
+        for model, entries in by_model.items():
+            plan = entries[0][0][0]._get_plan()
+            pks = list(set(pk for key, pk in entries))
+            loaded = dict(zip(pks, _load_by_pk(self.db_session, model, plan, pks, missing_ok=True)))
+            for key, pk in entries:
+                if loaded[pk] is not None:
+                    self.instances[key] = loaded[pk]
+
+    def restore(self, snapshot):
+        """
+        Restores the DB and the registered fixtures from a snapshot taken with :meth:`snapshot`. The session is rolled
+        back and cleared before, the registered fixtures are loaded again with one query per model.
+
+        :param snapshot: :class:`.Snapshot` instance
+        """
+        self.db_session.rollback()
+        self.db_session.expunge_all()
+
+        snapshot.connection.backup(_sqlite_connection(self.db_session))
+
+        self.instances.clear()
+        self._load_registry(snapshot.identities)
+
+
+class Snapshot(object):
+    """
+    Copy of the DB and of the fixture registry, see :meth:`.SqlaFixFact.snapshot`
+    """
+
+    def __init__(self, connection, identities):
+        # in-memory SQLite DB holding the copy
+        self.connection = connection
+        # registry key -> primary key of the instance
+        self.identities = identities
+
+    def close(self):
+        """
+        Releases the copy of the DB
+        """
+        self.connection.close()
+
+
+def _sqlite_connection(db_session):
+    """
+    Returns the DBAPI connection of a session bound to a SQLite DB.
+    """
+    connection = db_session.connection()
+    if connection.dialect.name != 'sqlite':
+        raise NotImplementedError('Snapshots are only supported for SQLite, not for ' + connection.dialect.name)
+
+    fairy = connection.connection
+    return getattr(fairy, 'driver_connection', None) or fairy.connection
+
+
+def registry_key(Fixture, kwargs):
+    """
+    Returns the key under which :meth:`.SqlaFixFact.get` registers the instance of a fixture.
+
+    The key is built from the fixture class itself (not only its name) and the normalized ``kwargs``. It does not depend
+    on the order of the ``kwargs`` and references declared with sub-factories are compared by their fixture, method
+    and ``kwargs``.
+
+    :param Fixture: fixture class
+    :param kwargs: key words to overwrite properties of this fixture
+    :return: hashable key
+    """
+    return Fixture, _freeze(kwargs)
+
+
+def _freeze(value):
+    """
+    Converts ``value`` into a hashable representation which is equal for equal values.
+    """
+    if isinstance(value, dict):
+        return dict, frozenset((k, _freeze(v)) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        return type(value), tuple(_freeze(v) for v in value)
+    elif isinstance(value, (set, frozenset)):
+        return frozenset, frozenset(_freeze(v) for v in value)
+
+    try:
+        hash(value)
+    except TypeError as e:
+        # no known container, e.g. a bytearray: compared by its representation, like the keys of former versions
+        return type(value), repr(value)
+    # the type tells apart values which compare equal, like 1 and True
+    return type(value), value
+
+
 ####
 # sub factory things
 ######
@@ -82,23 +541,56 @@ def subFactoryModel(fixture, **kwargs):
     return SubFactory(fixture, METHOD_MODEL, **kwargs)
 
 
-class SubFactory():
-    fixture = None
-    kwargs = None
+class SubFactory(object):
+    __slots__ = ('fixture', 'method', 'kwargs')
 
     def __init__(self, fixture, method, **kwargs):
         self.fixture = fixture
         self.method = method
         self.kwargs = kwargs
 
+    def _key(self):
+        return self.fixture, self.method, _freeze(self.kwargs)
+
+    def __eq__(self, other):
+        return isinstance(other, SubFactory) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+
+def _instrumented(method):
+    """
+    Decorator for the methods of :class:`BaseFix` which are recorded by :meth:`SqlaFixFact.instrument`
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self):
+            instrumentation = self._fix_fact.instrumentation
+            if instrumentation is None:
+                return fn(self)
+            with instrumentation.measure(self.__class__, method):
+                return fn(self)
+        return wrapper
+    return decorator
+
 
 class BaseFix():
     """
     Base class for each fixture
+
+    ``LOOKUP`` optionally names columns which identify the row of a fixture (a unique or natural key). :meth:`get`
+    then looks for an existing row with the same values before building the fixture, see
+    :meth:`.SqlaFixFact.lookup`.
     """
     MODEL = None
+    LOOKUP = None
     _fix_fact = None
     _kwargs = None
+    _plan = None
 
     def __init__(self, fix_fact, **kwargs):
         """
@@ -112,18 +604,20 @@ class BaseFix():
         self._fix_fact = fix_fact
         self._kwargs = kwargs
 
-        for rel in self.MODEL._sa_class_manager.mapper.relationships:
-            attr = getattr(self, rel.key, None)
-            if attr:
-                list_type_error = False
-                try:
-                    if False in [isinstance(a, SubFactory) for a in attr]:
-                        raise AttributeError('References in fixtures must be declared with "SubFactory": ' + rel.key)
-                except TypeError as e:
-                    # ok, attr is not iterable, maybe its directly a SubFactory
-                    if not isinstance(attr, SubFactory):
-                        raise AttributeError('References in fixtures must be declared with "SubFactory": ' + rel.key)
+        self._plan = self._get_plan()
 
+    @classmethod
+    def _get_plan(cls):
+        """
+        Returns the build plan of this fixture class. The plan is compiled on first use and cached on the class.
+        """
+        plan = cls.__dict__.get('_compiled_plan')
+        if plan is None or plan.model is not cls.MODEL:
+            plan = _FixturePlan(cls)
+            cls._compiled_plan = plan
+        return plan
+
+    @_instrumented(METHOD_MODEL)
     def model(self):
         """
         Returns a model instance of this fixture which is ready to be added. The model itself is not added to the DB
@@ -141,31 +635,231 @@ class BaseFix():
         # relations
         # [a.key for a in Group._sa_class_manager.mapper.relationships]
 
-        attributes = self.getAttributes()
-        if hasattr(self.MODEL(), 'update'):
+        if not self._fix_fact.lazy:
+            attributes = self.getAttributes()
+        else:
+            attributes = self.getRawAttributes()
+            lazy = [_LazyReference(self, key, attributes.pop(key)) for key in self._plan.relationship_keys
+                    if _has_sub_factory(attributes.get(key))]
+            attributes = self._resolveReferences(attributes, self._plan.hybrid_keys)
+
+        if self._plan.use_update:
             model = self.MODEL()
             model.update(**attributes)
         else:
             model = self.MODEL(**attributes)
+
+        if self._fix_fact.lazy:
+            state = inspect(model)
+            for reference in lazy:
+                _set_lazy_reference(state, reference)
         return model
 
+    @_instrumented(METHOD_CREATE)
     def create(self):
         """
         Adds this model to the session. This instance is not registered and thus can never be
         referred to via get
 
+        Within a :meth:`.SqlaFixFact.batch` block the flush is deferred and the instance is returned pending.
+
         :return: SQLAlchemy Model instance
         """
 
         model = self.model()
-        self._fix_fact.get_db_session().add(model)
-        self._fix_fact.get_db_session().flush()
-        self._fix_fact.get_db_session().expunge(model)
+        db_session = self._fix_fact.get_db_session()
+        db_session.add(model)
+        if self._fix_fact.in_batch():
+            return model
+        db_session.flush()
+
+        # values generated by the DB are expired by the flush, unless the mapper fetched them already with the INSERT
+        # (``eager_defaults``, via RETURNING where the dialect supports it). Load only those which are still missing.
+        expired = self._plan.server_default_keys.intersection(inspect(model).expired_attributes)
+        if expired:
+            db_session.refresh(model, attribute_names=expired)
 
-        # in order to have the right values for all fields updated directly by the DB, we have to load the model again
-        id_attr = class_mapper(self.MODEL).primary_key[0].name
-        id = getattr(model, id_attr)
-        return self._fix_fact.get_db_session().query(self.MODEL).get(id)
+        return model
+
+    def create_batch(self, n, overrides=None, pk_only=False):
+        """
+        Creates ``n`` instances of this fixture at once. Like :meth:`create`, the instances are not registered.
+
+        The attributes of all rows are built first and then inserted in bulk, with one executemany per table. Missing
+        integer primary keys are assigned up front from the max. key of the table, thus several processes inserting
+        into the same table at once have to use sharded factories (see :class:`SqlaFixFact`). Fixtures with
+        collection references or hybrid properties can not be expressed as plain rows, they are added to the session
+        and flushed once for the whole batch.
+
+        :param n: number of instances to create
+        :param overrides: *Optional:* per row key words to overwrite properties of this fixture, either a list with
+            one dict for each row or a callable which takes the index of the row and returns a dict
+        :param pk_only: if ``True`` only the primary keys of the created rows are returned (a tuple for composite
+            keys), which keeps the memory footprint low for big batches
+        :return: list of SQLAlchemy Model instances or primary keys
+        """
+        if overrides is not None and not callable(overrides) and len(overrides) != n:
+            raise ValueError('Expected %d overrides, got %d' % (n, len(overrides)))
+
+        plan = self._plan
+        db_session = self._fix_fact.get_db_session()
+
+        rows = []
+        for i in range(n):
+            kwargs = dict(self._kwargs)
+            if callable(overrides):
+                kwargs.update(overrides(i) or {})
+            elif overrides is not None:
+                kwargs.update(overrides[i])
+            rows.append(self.__class__(self._fix_fact, **kwargs).getAttributes())
+
+        bulk = not plan.use_update and all(plan.bulk_keys.issuperset(attrs) for attrs in rows)
+        if not bulk:
+            models = []
+            for attrs in rows:
+                if plan.use_update:
+                    model = self.MODEL()
+                    model.update(**attrs)
+                else:
+                    model = self.MODEL(**attrs)
+                models.append(model)
+            db_session.add_all(models)
+            self._fix_fact.flush(force=pk_only)
+
+            if pk_only:
+                return [plan.pk_from_instance(model) for model in models]
+            return models
+
+        mappings = _to_mappings(db_session, plan, rows)
+        _bulk_insert(db_session, plan, mappings)
+
+        pks = [plan.pk_from_mapping(m) for m in mappings]
+        if pk_only:
+            return pks
+        return _load_by_pk(db_session, self.MODEL, plan, pks)
+
+    def insert(self, n=1, overrides=None, return_pks=False):
+        """
+        Inserts ``n`` rows of this fixture with a Core ``Table.insert()``, bypassing the ORM: no instances are built for
+        the rows, references are resolved as usual and turned into foreign keys. Like :meth:`create`, the rows are
+        not registered.
+
+        The rows are inserted with one executemany on the connection of the session. Only fixtures which can be
+        expressed as plain rows of a single table are supported, i.e. no collection references, hybrid properties or
+        ``update()`` constructors.
+
+        :param n: *Optional:* number of rows to insert
+        :param overrides: *Optional:* per row key words, see :meth:`create_batch`
+        :param return_pks: if ``True`` the primary keys of the rows are returned. Missing integer primary keys are
+            assigned up front then (see :func:`_assign_pks`), rows with other missing keys are inserted one by one to
+            fetch their keys
+        :return: list of primary keys with ``return_pks``, else the number of inserted rows
+        """
+        if overrides is not None and not callable(overrides) and len(overrides) != n:
+            raise ValueError('Expected %d overrides, got %d' % (n, len(overrides)))
+
+        plan = self._plan
+        if plan.core_columns is None or plan.use_update:
+            raise ValueError('%s can not be inserted with Core, use create_batch()' % self.__class__.__name__)
+
+        rows = []
+        for i in range(n):
+            kwargs = dict(self._kwargs)
+            if callable(overrides):
+                kwargs.update(overrides(i) or {})
+            elif overrides is not None:
+                kwargs.update(overrides[i])
+            attrs = self.__class__(self._fix_fact, **kwargs).getAttributes()
+            if not plan.bulk_keys.issuperset(attrs):
+                raise ValueError('%s can not be inserted with Core, attributes %s are no columns'
+                                 % (self.__class__.__name__, ', '.join(sorted(set(attrs) - plan.bulk_keys))))
+            rows.append(attrs)
+
+        db_session = self._fix_fact.get_db_session()
+        mappings = _to_mappings(db_session, plan, rows)
+        if not mappings:
+            return [] if return_pks else 0
+        # the DB can not return the generated keys of an executemany
+        assigned = return_pks and _assign_pks(db_session, plan, mappings)
+        params = [dict((plan.core_columns[key], value) for key, value in mapping.items()) for mapping in mappings]
+
+        pk_columns = [plan.core_columns[key] for key in plan.pk_keys]
+        if not return_pks or all(p.get(c) is not None for p in params for c in pk_columns):
+            db_session.execute(plan.table.insert(), params)
+            if assigned:
+                _reset_sequence(db_session, plan.pk_column.table)
+            if return_pks:
+                return [plan.pk_from_mapping(dict(zip(plan.pk_keys, [p[c] for c in pk_columns]))) for p in params]
+            return len(params)
+
+        pks = []
+        for p in params:
+            pk = tuple(db_session.execute(plan.table.insert(), p).inserted_primary_key)
+            pks.append(pk[0] if len(pk) == 1 else pk)
+        return pks
+
+    def stream(self, total, chunk_size=1000, overrides=None, progress=False, commit=True, core=False):
+        """
+        Generator which creates ``total`` instances of this fixture in chunks of ``chunk_size`` with
+        :meth:`create_batch`, to seed big tables with flat memory usage.
+
+        Each chunk is committed (or only flushed with ``commit=False``) before the next one is built. The rows are
+        inserted with ``pk_only``, thus no instances are kept in the session. Nothing is created unless the generator
+        is consumed.
+
+        :param total: number of instances to create
+        :param chunk_size: *Optional:* number of instances per chunk
+        :param overrides: *Optional:* per row key words, see :meth:`create_batch`. A callable gets the index of the row
+            within ``total``
+        :param progress: if ``True`` a :class:`StreamProgress` is generated per chunk instead of the primary keys
+        :param commit: if ``False`` the chunks are only flushed, e.g. to roll them back at the end of a test
+        :param core: if ``True`` the chunks are inserted with :meth:`insert` instead, the primary keys of the
+            :class:`StreamProgress` are ``None`` then
+        :return: generator of primary keys or of :class:`StreamProgress`
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive: %r' % chunk_size)
+        if overrides is not None and not callable(overrides) and len(overrides) != total:
+            raise ValueError('Expected %d overrides, got %d' % (total, len(overrides)))
+
+        db_session = self._fix_fact.get_db_session()
+        start = default_timer()
+        for offset in range(0, total, chunk_size):
+            n = min(chunk_size, total - offset)
+            if callable(overrides):
+                chunk_overrides = lambda i, offset=offset: overrides(offset + i)
+            elif overrides is not None:
+                chunk_overrides = overrides[offset:offset + n]
+            else:
+                chunk_overrides = None
+
+            if not core:
+                pks = self.create_batch(n, chunk_overrides, pk_only=True)
+            elif progress:
+                pks = None
+                self.insert(n, chunk_overrides)
+            else:
+                pks = self.insert(n, chunk_overrides, return_pks=True)
+            if commit:
+                db_session.commit()
+            else:
+                self._fix_fact.flush(force=True)
+
+            if progress:
+                yield StreamProgress(offset + n, total, pks, default_timer() - start)
+            else:
+                for pk in pks:
+                    yield pk
+
+    def _lookupValues(self):
+        """
+        Returns the values of the ``LOOKUP`` columns of this fixture, like :meth:`getRawAttributes` would.
+        """
+        plan = self._plan
+        values = []
+        for key in plan.lookup_keys:
+            values.append(self._kwargs[key] if key in self._kwargs else getattr(self, key, None))
+        return tuple(values)
 
     def get(self):
         """
@@ -176,68 +870,437 @@ class BaseFix():
         """
         return self._fix_fact.get(self.__class__, **self._kwargs)
 
-    def getAttributes(self):
-        def getAttr(key):
-            if key in self._kwargs:
-                return self._kwargs[key]
+    def getRawAttributes(self):
+        """
+        Returns the attributes of this fixture as declared, references to other fixtures are not resolved yet.
+
+        :return: dict of attribute names and values
+        """
+        plan = self._plan
+        kwargs = self._kwargs
+
+        attrs = {}
+        for key in plan.attribute_keys:
+            if key in kwargs:
+                value = kwargs[key]
+            elif key in plan.declared_keys or key in self.__dict__:
+                value = getattr(self, key, None)
             else:
-                return getattr(self, key, None)
+                continue
+
+            if value is not None:
+                attrs[key] = value
+
+        if self._fix_fact.is_sharded() and plan.shard_pk_key and plan.shard_pk_key not in attrs:
+            attrs[plan.shard_pk_key] = self._fix_fact.next_pk(plan.pk_column.table)
+
+        return attrs
 
-        attrs = dict([(a.key, getAttr(a.key)) for a in self.MODEL._sa_class_manager.mapper.attrs if (getAttr(a.key) is not None)])
+    def getAttributes(self):
+        return self._resolveReferences(self.getRawAttributes(), self._plan.reference_keys)
 
-        # add hybrids
-        for a in inspect(self.MODEL).all_orm_descriptors.keys():
-            if (getAttr(a) is not None) and a != '__mapper__':
-                attrs[a] = getAttr(a)
+    def _resolveReferences(self, attrs, keys):
+        for key in keys:
+            converted = self._resolveReference(attrs.get(key, None))
+            if converted:
+                attrs[key] = converted
 
-        def resolveSubFactory(attr):
-            if isinstance(attr, SubFactory):
-                if attr.method == METHOD_GET:
-                    return attr.fixture(self._fix_fact, **attr.kwargs).get()
-                elif attr.method == METHOD_CREATE:
-                    return attr.fixture(self._fix_fact, **attr.kwargs).create()
-                elif attr.method == METHOD_MODEL:
-                    return attr.fixture(self._fix_fact, **attr.kwargs).model()
+        return attrs
 
-            return None
+    def _resolveReference(self, attr):
+        try:
+            values = list(attr)
+        except TypeError as e:
+            # seems not be a list, try it as an attribute
+            return self._resolveSubFactory(attr)
 
-        for rel in self.MODEL._sa_class_manager.mapper.relationships:
-            attr = attrs.get(rel.key, None)
+        # the elements of a collection are flushed at once instead of one by one, so the ORM can insert the rows of
+        # each table (and of the association table of a ``secondary`` relationship) together
+        with self._fix_fact._deferred():
+            converted = []
+            pending = []
+            for a in values:
+                instance = self._resolveSubFactory(a)
+                if instance:
+                    converted.append(instance)
+                    if inspect(instance).pending:
+                        pending.append((instance, a.fixture._get_plan()))
+        if pending and not self._fix_fact.in_batch():
+            # with their keys set up front, the ORM inserts the rows of each table with a single executemany
+            db_session = self._fix_fact.get_db_session()
+            tables = _assign_instance_pks(db_session, pending)
+            self._fix_fact.flush()
+            for table in tables:
+                _reset_sequence(db_session, table)
 
+        return converted
 
-            try:
-                converted = []
-                for a in attr:
-                    a = resolveSubFactory(a)
-                    if a:
-                        converted.append(a)
-#                converted = [a for resolveSubFactory(a) in attr if a]
+    def _resolveSubFactory(self, attr):
+        if isinstance(attr, SubFactory):
+            if attr.method == METHOD_GET:
+                return attr.fixture(self._fix_fact, **attr.kwargs).get()
+            elif attr.method == METHOD_CREATE:
+                return attr.fixture(self._fix_fact, **attr.kwargs).create()
+            elif attr.method == METHOD_MODEL:
+                return attr.fixture(self._fix_fact, **attr.kwargs).model()
+
+        return None
+
+
+class StreamProgress(object):
+    """
+    Progress of :meth:`.BaseFix.stream` after a chunk
+    """
+    __slots__ = ('done', 'total', 'pks', 'seconds')
+
+    def __init__(self, done, total, pks, seconds):
+        # number of instances created so far
+        self.done = done
+        self.total = total
+        # primary keys of the instances of this chunk, None for Core inserts
+        self.pks = pks
+        # time since the start of the stream
+        self.seconds = seconds
+
+    def __repr__(self):
+        return '<StreamProgress %d/%d, %.3fs>' % (self.done, self.total, self.seconds)
+
+
+class _LazyReference(object):
+    """
+    Loader callable of a relationship with a not yet resolved reference to other fixtures. Called by SQLAlchemy on the
+    first read of the relationship, see :class:`.SqlaFixFact` with ``lazy=True``.
+    """
+    __slots__ = ('fixture', 'key', 'value', 'required')
+
+    def __init__(self, fixture, key, value):
+        self.fixture = fixture
+        self.key = key
+        self.value = value
+        self.required = key in fixture._plan.required_keys
 
+    def __call__(self, state, passive):
+        if not passive & SQL_OK or not passive & NON_PERSISTENT_OK:
+            # not a real read, e.g. the old value when the relationship is overwritten: nothing is built for it
+            return PASSIVE_NO_RESULT
+        self.resolve(state)
+        return ATTR_WAS_SET
+
+    def resolve(self, state):
+        # remove the callable first, setting the attribute reads the old value
+        state.callables.pop(self.key, None)
+        state.info.get(_LAZY_REFERENCES, {}).pop(self.key, None)
+        setattr(state.obj(), self.key, self.fixture._resolveReference(self.value))
+
+
+def _reachable_gets(fix_fact, roots):
+    """
+    Walks the references of the ``(fixture, method)`` pairs of ``roots`` and returns the fixtures built via get, each
+    once. Registered fixtures and fixtures searched already (see :meth:`SqlaFixFact._searching`) are skipped together
+    with their references.
+    """
+    seen = set()
+    result = []
+    todo = list(roots)
+    while todo:
+        fixture, method = todo.pop()
+        if method == METHOD_GET:
+            key = registry_key(fixture.__class__, fixture._kwargs)
+            if key in seen or key in fix_fact._searched or key in fix_fact.instances:
+                continue
+            seen.add(key)
+            result.append(fixture)
+
+        for attr_key in fixture._plan.reference_keys:
+            value = fixture._kwargs[attr_key] if attr_key in fixture._kwargs else getattr(fixture, attr_key, None)
+            try:
+                values = list(value)
             except TypeError as e:
-                # seems not be a list, try it as an attribute
-                converted = resolveSubFactory(attr)
+                # not a list, a single reference
+                values = [value]
+            for v in values:
+                if isinstance(v, SubFactory):
+                    todo.append((v.fixture(fix_fact, **v.kwargs), v.method))
+    return result
 
-            if converted:
-                attrs[rel.key] = converted
 
-        # also add hybrid properties
-        for hyb in inspect(self.MODEL).all_orm_descriptors.keys():
-            if inspect(self.MODEL).all_orm_descriptors[hyb].extension_type is hybrid.HYBRID_PROPERTY:
-                attr = attrs.get(hyb, None)
+def _has_sub_factory(value):
+    if isinstance(value, SubFactory):
+        return True
+    try:
+        return any(isinstance(v, SubFactory) for v in value)
+    except TypeError as e:
+        return False
 
-                try:
-                    converted = []
-                    for a in attr:
-                        a = resolveSubFactory(a)
-                        if a:
-                            converted.append(a)
-                        #                converted = [a for resolveSubFactory(a) in attr if a]
 
+# key of the not yet resolved references in ``InstanceState.info``
+_LAZY_REFERENCES = 'sqlalchemy_fixture_factory.lazy_references'
+
+
+def _set_lazy_reference(state, reference):
+    _set_loader(state, reference)
+    # expiring the instance removes the loaders, they are set again by _restore_lazy_references
+    state.info.setdefault(_LAZY_REFERENCES, {})[reference.key] = reference
+    if not event.contains(state.class_, 'expire', _restore_lazy_references):
+        event.listen(state.class_, 'expire', _restore_lazy_references, raw=True)
+    attribute = getattr(state.class_, reference.key)
+    if not event.contains(attribute, 'set', _drop_lazy_reference):
+        event.listen(attribute, 'set', _drop_lazy_reference, raw=True)
+        event.listen(attribute, 'bulk_replace', _drop_lazy_reference, raw=True)
+
+
+def _set_loader(state, reference):
+    # SQLAlchemy starts with an immutable empty tuple
+    if not state.callables:
+        state.callables = {}
+    state.callables[reference.key] = reference
+
+
+def _drop_lazy_reference(state, *args):
+    """
+    Listener of ``set`` and ``bulk_replace``: a reference which is overwritten before it was read is never resolved.
+    """
+    key = args[-1].key
+    if state.callables and isinstance(state.callables.get(key), _LazyReference):
+        del state.callables[key]
+    state.info.get(_LAZY_REFERENCES, {}).pop(key, None)
+
+
+def _restore_lazy_references(state, attribute_names):
+    """
+    Listener of ``expire``: sets the loaders of the references which were not read yet again, e.g. after a commit.
+    """
+    for key, reference in state.info.get(_LAZY_REFERENCES, {}).items():
+        if attribute_names is None or key in attribute_names:
+            _set_loader(state, reference)
+
+
+def _lazy_references(state):
+    return [c for c in state.callables and state.callables.values() if isinstance(c, _LazyReference)]
+
+
+def _copy_lazy_references(source, target):
+    target_state = inspect(target)
+    for reference in _lazy_references(inspect(source)):
+        _set_lazy_reference(target_state, reference)
+
+
+class _FixturePlan(object):
+    """
+    Introspection result of a fixture class, compiled once and reused for every instance of the fixture.
+
+    Holds the validated relationship keys, the attribute keys of the model (columns, relationships and other ORM
+    descriptors like hybrids), the keys for which sub-factories have to be resolved and the constructor strategy.
+    """
+
+    def __init__(self, Fixture):
+        model = Fixture.MODEL
+        mapper = class_mapper(model)
+
+        relationship_keys = [rel.key for rel in mapper.relationships]
+        for key in relationship_keys:
+            attr = getattr(Fixture, key, None)
+            if attr:
+                try:
+                    if False in [isinstance(a, SubFactory) for a in attr]:
+                        raise AttributeError('References in fixtures must be declared with "SubFactory": ' + key)
                 except TypeError as e:
-                    # seems not be a list, try it as an attribute
-                    converted = resolveSubFactory(attr)
+                    # ok, attr is not iterable, maybe its directly a SubFactory
+                    if not isinstance(attr, SubFactory):
+                        raise AttributeError('References in fixtures must be declared with "SubFactory": ' + key)
 
-                if converted:
-                    attrs[hyb] = converted
+        descriptors = inspect(model).all_orm_descriptors
+        attribute_keys = [a.key for a in mapper.attrs]
+        for key in descriptors.keys():
+            if key != '__mapper__' and key not in attribute_keys:
+                attribute_keys.append(key)
 
-        return attrs
+        hybrid_keys = [key for key in descriptors.keys()
+                       if key != '__mapper__' and descriptors[key].extension_type is hybrid.HYBRID_PROPERTY]
+
+        self.model = model
+        self.relationship_keys = tuple(relationship_keys)
+        self.hybrid_keys = tuple(hybrid_keys)
+        self.attribute_keys = tuple(attribute_keys)
+        # keys with a value defined on the fixture class, all others can only be set via kwargs or on the instance
+        self.declared_keys = frozenset(key for key in attribute_keys if hasattr(Fixture, key))
+        # relationships first, then hybrid properties; same order as the sub-factories are resolved
+        self.reference_keys = self.relationship_keys + self.hybrid_keys
+        self.use_update = hasattr(model, 'update')
+        # columns filled in by the DB, see :meth:`BaseFix.create`
+        self.server_default_keys = frozenset(
+            prop.key for prop in mapper.column_attrs
+            if any(col.server_default is not None or col.server_onupdate is not None for col in prop.columns))
+
+        # needed to turn the attributes into plain rows, see :meth:`BaseFix.create_batch`
+        self.pk_keys = tuple(mapper.get_property_by_column(c).key for c in mapper.primary_key)
+        self.scalar_references = dict(
+            (rel.key, [(mapper.get_property_by_column(local).key, rel.mapper.get_property_by_column(remote).key)
+                       for local, remote in rel.local_remote_pairs])
+            for rel in mapper.relationships if rel.direction is MANYTOONE and not rel.secondary)
+        # references which have to be resolved before the instance is flushed, see :class:`SqlaFixFact`
+        self.required_keys = frozenset(
+            rel.key for rel in mapper.relationships
+            if rel.direction is MANYTOONE and any(not col.nullable for col in rel.local_columns))
+        self.bulk_keys = frozenset([a.key for a in mapper.column_attrs] + list(self.scalar_references))
+        self.column_keys = frozenset(a.key for a in mapper.column_attrs)
+
+        # integer key which is assigned from the range of the worker, see :class:`SqlaFixFact`, or up front for bulk
+        # inserts, see :func:`_assign_pks`
+        self.table = mapper.local_table
+        self.shard_pk_key = None
+        self.pk_column = None
+        if len(mapper.primary_key) == 1 and _is_integer_pk(mapper.primary_key[0]):
+            self.shard_pk_key = self.pk_keys[0]
+            # column of the table holding the key, the base table with joined table inheritance
+            self.pk_column = mapper.primary_key[0]
+        self.relationships = dict((rel.key, rel) for rel in mapper.relationships)
+
+        self.lookup_keys = tuple(Fixture.LOOKUP or ())
+        for key in self.lookup_keys:
+            if key not in self.column_keys:
+                raise AttributeError('Lookup keys of fixtures must be columns: ' + key)
+
+        # attribute key -> key of the column in the table, for Core inserts; None if the model has no plain table
+        self.core_columns = None
+        # ``persist_selectable`` was called ``mapped_table`` before SQLAlchemy 1.3
+        persist_selectable = getattr(mapper, 'persist_selectable', None)
+        if persist_selectable is None:
+            persist_selectable = mapper.mapped_table
+        if mapper.local_table is persist_selectable and \
+                all(len(prop.columns) == 1 and prop.columns[0].table is self.table for prop in mapper.column_attrs):
+            self.core_columns = dict((prop.key, prop.columns[0].key) for prop in mapper.column_attrs)
+
+    def pk_from_mapping(self, mapping):
+        pk = tuple(mapping[key] for key in self.pk_keys)
+        return pk[0] if len(pk) == 1 else pk
+
+    def pk_from_instance(self, instance):
+        pk = tuple(getattr(instance, key) for key in self.pk_keys)
+        return pk[0] if len(pk) == 1 else pk
+
+
+def _is_integer_pk(column):
+    return column.primary_key and len(column.table.primary_key.columns) == 1 and isinstance(column.type, Integer)
+
+
+def _to_mappings(db_session, plan, rows):
+    """
+    Turns resolved attributes into plain rows: references are replaced by their foreign keys.
+    """
+    # references built with subFactoryModel are not in the DB yet, but their keys are needed for the rows
+    pending = False
+    for attrs in rows:
+        for key in plan.scalar_references:
+            related = attrs.get(key)
+            if related is not None and inspect(related).key is None:
+                db_session.add(related)
+                pending = True
+    if pending:
+        db_session.flush()
+
+    mappings = []
+    for attrs in rows:
+        mapping = {}
+        for key, value in attrs.items():
+            if key in plan.scalar_references:
+                for local_key, remote_key in plan.scalar_references[key]:
+                    mapping[local_key] = getattr(value, remote_key)
+            else:
+                mapping[key] = value
+        mappings.append(mapping)
+    return mappings
+
+
+def _bulk_insert(db_session, plan, mappings):
+    """
+    Inserts the rows of ``mappings`` with one executemany per table. Missing integer primary keys are assigned up
+    front (see :func:`_assign_pks`), other missing keys are fetched back from the DB row by row. In both cases they
+    are set in the ``mappings``.
+    """
+    assigned = _assign_pks(db_session, plan, mappings)
+    missing_pk = any(mapping.get(key) is None for mapping in mappings for key in plan.pk_keys)
+    db_session.bulk_insert_mappings(plan.model, mappings, return_defaults=missing_pk)
+    if assigned:
+        _reset_sequence(db_session, plan.pk_column.table)
+
+
+def _assign_pks(db_session, plan, mappings):
+    """
+    Sets consecutive integer primary keys behind the max. key of the table in the rows of ``mappings`` which have none,
+    so they can be inserted with a single executemany. The DB can not return the generated keys of an executemany.
+
+    Like with :func:`.stream_parallel`, several processes inserting into the same table at the same time have to use
+    sharded factories, see :class:`SqlaFixFact`.
+
+    :return: ``True`` if keys were assigned
+    """
+    key = plan.shard_pk_key
+    missing = [mapping for mapping in mappings if key and mapping.get(key) is None]
+    if not missing:
+        return False
+
+    pks = [mapping[key] for mapping in mappings if mapping.get(key) is not None]
+    pks.append(db_session.query(func.max(plan.pk_column)).scalar() or 0)
+    first_pk = max(pks) + 1
+    for i, mapping in enumerate(missing):
+        mapping[key] = first_pk + i
+    return True
+
+
+def _assign_instance_pks(db_session, instances):
+    """
+    Sets the missing integer primary keys of pending instances, like :func:`_assign_pks` does for rows.
+
+    :param instances: pending instances, each with the plan of its fixture: ``(instance, plan)``
+    :return: the tables for which keys were assigned
+    """
+    groups = {}
+    for instance, plan in instances:
+        if plan.shard_pk_key:
+            groups.setdefault(plan.pk_column.table, (plan, []))[1].append(instance)
+
+    tables = []
+    # the pending instances must not be flushed by the query for the max. key
+    with db_session.no_autoflush:
+        for table, (plan, group) in groups.items():
+            mappings = [{plan.shard_pk_key: getattr(instance, plan.shard_pk_key)} for instance in group]
+            if _assign_pks(db_session, plan, mappings):
+                for instance, mapping in zip(group, mappings):
+                    setattr(instance, plan.shard_pk_key, mapping[plan.shard_pk_key])
+                tables.append(table)
+    return tables
+
+
+def _reset_sequence(db_session, table):
+    """
+    Rows with explicit primary keys do not advance sequences on PostgreSQL, move them behind the inserted keys.
+    """
+    if db_session.get_bind().dialect.name != 'postgresql':
+        return
+
+    for column in table.primary_key.columns:
+        if column.autoincrement and isinstance(column.type, Integer):
+            max_id = db_session.query(func.max(column)).scalar()
+            if max_id is not None:
+                db_session.execute(text('SELECT setval(pg_get_serial_sequence(:table, :column), :value)'),
+                                   {'table': table.fullname, 'column': column.name, 'value': max_id})
+
+
+def _load_by_pk(db_session, model, plan, pks, missing_ok=False):
+    """
+    Loads the instances for the given primary keys with one query per :data:`IN_CHUNK_SIZE` keys, in the order of
+    ``pks``. With ``missing_ok`` keys without row get ``None``.
+    """
+    if len(plan.pk_keys) == 1:
+        pk_expr = getattr(model, plan.pk_keys[0])
+    else:
+        pk_expr = tuple_(*[getattr(model, key) for key in plan.pk_keys])
+
+    loaded = {}
+    for i in range(0, len(pks), IN_CHUNK_SIZE):
+        for inst in db_session.query(model).filter(pk_expr.in_(pks[i:i + IN_CHUNK_SIZE])):
+            loaded[plan.pk_from_instance(inst)] = inst
+    if missing_ok:
+        return [loaded.get(pk) for pk in pks]
+    return [loaded[pk] for pk in pks]
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015, Michael Pickelbauer
+# License: MIT (see LICENSE for details)
+
+"""
+Fixture factory shared by several threads, each with its own session
+"""
+import threading
+
+from sqlalchemy import inspect
+
+from sqlalchemy_fixture_factory.sqla_fix_fact import SqlaFixFact, registry_key
+
+
+class ThreadedSqlaFixFact(object):
+    """
+    Fixture factory manager for several threads, e.g. workers of a load test.
+
+    Each thread gets its own :class:`.SqlaFixFact` with its own session from ``session_factory``. All attributes of
+    the factory of the current thread are available on this object, thus it is passed to the fixtures like a
+    :class:`.SqlaFixFact`:
+
+    .. code-block:: python
+
+        fix_fact = ThreadedSqlaFixFact(sessionmaker(bind=engine))
+
+        def worker():
+            for i in range(1000):
+                ArnoldPerson(fix_fact).create()
+                fix_fact.get_db_session().commit()
+            fix_fact.close()
+
+    The fixtures built with :meth:`.BaseFix.get` are shared by all threads. Each one is created exactly once: the
+    first thread asking for it creates it in a separate session and commits it, other threads asking for the same
+    fixture meanwhile wait for it and load it into their sessions. Threads only wait for the fixtures they need, there
+    is no global lock while fixtures are built.
+
+    SQLite allows only one writing transaction at a time: a shared fixture can not be created while the session of the
+    thread holds uncommitted writes, the separate session would wait for the lock of the thread itself. This raises a
+    ``ValueError`` instead, commit the session before (or build the shared fixtures first).
+
+    With the sharding options (see :class:`.SqlaFixFact`) the threads share the primary keys of the worker: each key
+    is handed out to one thread only.
+    """
+
+    def __init__(self, session_factory, **kwargs):
+        """
+        :param session_factory: callable returning a new session, e.g. a ``sessionmaker``
+        :param kwargs: *Optional:* options of the factory of each thread, see :class:`.SqlaFixFact`. A ``registry`` is
+            not supported, each thread has its own
+        """
+        assert session_factory, 'Passed in session factory is None!'
+        if 'registry' in kwargs:
+            raise ValueError('ThreadedSqlaFixFact does not support a registry, the threads can not share one')
+        self._shared = _SharedRegistry(session_factory, kwargs)
+        self._local = threading.local()
+
+    @property
+    def fix_fact(self):
+        """
+        :class:`.SqlaFixFact` of the current thread, created on first use
+        """
+        fix_fact = getattr(self._local, 'fix_fact', None)
+        if fix_fact is None:
+            fix_fact = self._local.fix_fact = _ThreadFixFact(self._shared, self._shared.session_factory())
+        return fix_fact
+
+    def __getattr__(self, name):
+        if name in ('_shared', '_local'):
+            # not initialized yet
+            raise AttributeError(name)
+        return getattr(self.fix_fact, name)
+
+    def close(self):
+        """
+        Closes the session of the current thread. The shared fixtures stay registered.
+        """
+        fix_fact = getattr(self._local, 'fix_fact', None)
+        if fix_fact is not None:
+            fix_fact.get_db_session().close()
+            self._local.fix_fact = None
+
+
+class _ThreadFixFact(SqlaFixFact):
+    """
+    Factory of one thread, see :class:`ThreadedSqlaFixFact`. Its registry holds the instances of the shared fixtures
+    loaded into its session.
+    """
+
+    def __init__(self, shared, db_session):
+        SqlaFixFact.__init__(self, db_session, **shared.options)
+        self.shared = shared
+        self._next_pks = shared.next_pks
+
+    def next_pk(self, table):
+        with self.shared.pk_lock:
+            return SqlaFixFact.next_pk(self, table)
+
+    def _get(self, Fixture, kwargs):
+        key = registry_key(Fixture, kwargs)
+        inst = self.instances.get(key)
+        if inst is not None and inst in self.db_session:
+            return inst
+
+        identity_key = self.shared.get_or_create(key, lambda: self._create_shared(Fixture, kwargs))
+        inst = self.db_session.query(identity_key[0]).get(identity_key[1])
+        self.instances[key] = inst
+        return inst
+
+    def _create_shared(self, Fixture, kwargs):
+        if self._holds_write_lock():
+            raise ValueError('%s can not be created while the session of the thread has uncommitted writes on SQLite, '
+                             'commit it before' % Fixture.__name__)
+
+        db_session = self.shared.session_factory()
+        try:
+            fix_fact = _ThreadFixFact(self.shared, db_session)
+            identity_key = inspect(SqlaFixFact._get(fix_fact, Fixture, kwargs)).identity_key
+            db_session.commit()
+            return identity_key
+        finally:
+            db_session.close()
+
+    def _holds_write_lock(self):
+        """
+        :return: ``True`` if the session of the thread has uncommitted writes on SQLite
+        """
+        if self.db_session.get_bind().dialect.name != 'sqlite':
+            return False
+        # the SQLite driver only begins a transaction with the first write
+        return getattr(self.db_session.connection().connection, 'in_transaction', False)
+
+
+class _Slot(object):
+    __slots__ = ('done', 'identity_key')
+
+    def __init__(self):
+        self.done = threading.Event()
+        # identity key of the created instance, None until it is created or if creating it failed
+        self.identity_key = None
+
+
+class _SharedRegistry(object):
+    """
+    Registry of the fixtures shared by the threads: registry key -> identity key of the instance.
+    """
+
+    def __init__(self, session_factory, options):
+        self.session_factory = session_factory
+        self.options = options
+        # only held to look up or add slots, never while a fixture is built
+        self._lock = threading.Lock()
+        self._slots = {}
+        # counters of the primary keys of all threads, see :meth:`.SqlaFixFact.next_pk`
+        self.next_pks = {}
+        self.pk_lock = threading.Lock()
+
+    def get_or_create(self, key, create):
+        """
+        Returns the identity key registered for ``key``. If there is none yet, ``create`` is called to create it, by
+        exactly one thread. Other threads wait for it meanwhile. If ``create`` fails, one of them tries again.
+        """
+        while True:
+            slot = self._slots.get(key)
+            if slot is None:
+                with self._lock:
+                    slot = self._slots.get(key)
+                    creator = slot is None
+                    if creator:
+                        slot = self._slots[key] = _Slot()
+
+                if creator:
+                    try:
+                        slot.identity_key = create()
+                    except BaseException:
+                        with self._lock:
+                            del self._slots[key]
+                        raise
+                    finally:
+                        slot.done.set()
+                    return slot.identity_key
+
+            slot.done.wait()
+            if slot.identity_key is not None:
+                return slot.identity_key
@@ -5,7 +5,7 @@
 """
 
 from __future__ import absolute_import, print_function, unicode_literals, division
-from sqlalchemy import Table, Column, Integer, ForeignKey, Unicode, create_engine
+from sqlalchemy import Table, Column, Integer, ForeignKey, Unicode, create_engine, event, text
 import sqlalchemy
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
@@ -19,17 +19,21 @@ class TestCase(object):
     Role = None
     Account = None
     Person = None
+    Setting = None
 
     engine = None
     connection = None
     db_session = None
     fix_fact = None
+    statements = None
 
     def setup_method(self, method):
         self.Base = declarative_base()
 
         self.engine = create_engine('sqlite:///')
         # self.engine.echo = True
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.count_statement)
         self.create_models()
 
         sqlalchemy.orm.configure_mappers()
@@ -44,6 +48,9 @@ class TestCase(object):
         self.fix_fact = SqlaFixFact(self.db_session)
 
 
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
     def create_tables(self):
         self.Base.metadata.create_all(self.connection)
 
@@ -85,6 +92,14 @@ class TestCase(object):
             account_id = Column(Integer, ForeignKey('account.id'))
             account = relationship(Account)
 
+        class Setting(self.Base):
+            __tablename__ = 'setting'
+
+            scope = Column(Unicode, primary_key=True)
+            name = Column(Unicode, primary_key=True)
+            value = Column(Unicode, server_default=text("'on'"))
+
         self.Role = Role
         self.Account = Account
-        self.Person = Person
\ No newline at end of file
+        self.Person = Person
+        self.Setting = Setting
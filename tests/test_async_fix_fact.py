@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the fixture factory on top of an AsyncSession
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import StaticPool
+
+from sqlalchemy_fixture_factory import sqla_fix_fact
+from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix
+
+from tests import TestCase
+
+pytest.importorskip('aiosqlite')
+sqlalchemy_asyncio = pytest.importorskip('sqlalchemy.ext.asyncio')
+
+from sqlalchemy_fixture_factory.async_fix_fact import AsyncSqlaFixFact
+
+
+class TestAsyncFixFact(TestCase):
+
+    def setup_method(self, method):
+        self.Base = declarative_base()
+        self.create_models()
+
+    def teardown_method(self, method):
+        pass
+
+    def run(self, test):
+        async def run():
+            engine = sqlalchemy_asyncio.create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+            async with engine.begin() as connection:
+                await connection.run_sync(self.Base.metadata.create_all)
+
+            async with sqlalchemy_asyncio.AsyncSession(engine) as session:
+                await test(session, AsyncSqlaFixFact(session))
+            await engine.dispose()
+
+        asyncio.run(run())
+
+    def define_fixtures(self):
+        class AdminRole(BaseFix):
+            MODEL = self.Role
+            name = 'admin'
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'peter'
+            roles = [sqla_fix_fact.subFactoryGet(AdminRole)]
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixAccount)
+
+        return FixAccount, FixPerson
+
+    async def count(self, session, model):
+        return (await session.execute(select(func.count()).select_from(model))).scalar()
+
+    def test_create_and_get(self):
+        FixAccount, FixPerson = self.define_fixtures()
+
+        async def test(session, fix_fact):
+            p = await fix_fact.create(FixPerson)
+            p2 = await fix_fact.create(FixPerson, first_name='Sepp')
+            account = await fix_fact.get(FixAccount)
+
+            assert p.id is not None
+            assert 'Sepp' == p2.first_name
+            assert p.account is account is p2.account
+            assert 2 == await self.count(session, self.Person)
+            assert 1 == await self.count(session, self.Account)
+            assert 1 == await self.count(session, self.Role)
+
+        self.run(test)
+
+    def test_batch_operations(self):
+        FixAccount, FixPerson = self.define_fixtures()
+
+        async def test(session, fix_fact):
+            ids = await fix_fact.create_batch(FixPerson, 3, pk_only=True)
+            persons = await fix_fact.materialize([sqla_fix_fact.subFactoryCreate(FixPerson, first_name='Sepp')])
+
+            async with fix_fact.batch():
+                pending = await fix_fact.create(FixPerson)
+                assert pending.id is None
+            assert pending.id is not None
+
+            assert 3 == len(set(ids))
+            assert 'Sepp' == persons[0].first_name
+            assert 5 == await self.count(session, self.Person)
+            assert 1 == await self.count(session, self.Account)
+
+        self.run(test)
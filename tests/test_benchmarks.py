@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""
+Smoke tests for the benchmarks
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+import json
+
+from benchmarks import bench_fixtures
+
+
+def test_run_all_cases():
+    results = bench_fixtures.run([2], [2])
+
+    cases = set(r['case'] for r in results)
+    assert set(bench_fixtures.CASES) == cases
+    assert set(bench_fixtures.ENGINES) == set(r['engine'] for r in results)
+    assert all(r['seconds'] > 0 for r in results)
+    assert [2] == [r['depth'] for r in results if r['case'] == 'chain' and r['engine'] == 'memory']
+    assert 1 == [r['statements'] for r in results if r['case'] == 'get_hit'][0]
+
+
+def test_compare_with_baseline(tmpdir):
+    output = str(tmpdir.join('results.json'))
+    baseline = str(tmpdir.join('baseline.json'))
+
+    results = bench_fixtures.run([2], [1], engines=['memory'], cases=['model', 'create'])
+    for r in results:
+        r['seconds'] /= 100
+    with open(baseline, 'w') as f:
+        json.dump({'results': results}, f)
+
+    assert 1 == bench_fixtures.main(['--n', '2', '--engine', 'memory', '--case', 'model', 'create',
+                                     '--output', output, '--baseline', baseline])
+    assert 0 == bench_fixtures.main(['--n', '2', '--engine', 'memory', '--case', 'model', 'create',
+                                     '--baseline', output, '--threshold', '1000'])
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the portable seed bundles
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+import datetime
+import decimal
+import json
+
+import pytest
+
+from sqlalchemy_fixture_factory import sqla_fix_fact
+from sqlalchemy_fixture_factory.bundle import write_bundle, load_bundle, _encode, _decode
+from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix
+
+from tests import TestCase
+
+
+class TestBundle(TestCase):
+
+    def define_fixtures(self):
+        class AdminRole(BaseFix):
+            MODEL = self.Role
+            name = 'admin'
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'peter'
+            roles = [sqla_fix_fact.subFactoryGet(AdminRole)]
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixAccount)
+
+        return FixAccount, FixPerson
+
+    @pytest.mark.parametrize('name', ['seed.jsonl', 'seed.jsonl.gz'])
+    def test_write_and_load(self, tmpdir, name):
+        path = str(tmpdir.join(name))
+        FixAccount, FixPerson = self.define_fixtures()
+
+        built = write_bundle(self.fix_fact, self.Base.metadata, [FixPerson(self.fix_fact, first_name='a'),
+                                                                 sqla_fix_fact.subFactoryGet(FixPerson)], path)
+        built_ids = [p.id for p in built]
+
+        # start over with empty tables
+        self.teardown_method(None)
+        self.setup_method(None)
+        FixAccount, FixPerson = self.define_fixtures()
+
+        del self.statements[:]
+        loaded = load_bundle(self.fix_fact, self.Base.metadata, path, [FixPerson(self.fix_fact, first_name='a'),
+                                                                       sqla_fix_fact.subFactoryGet(FixPerson)])
+
+        inserts = [s for s in self.statements if s.startswith('INSERT')]
+        assert 4 == len(inserts)
+        assert built_ids == [p.id for p in loaded]
+        assert ['admin'] == [r.name for r in loaded[0].account.roles]
+        assert loaded[1] is FixPerson(self.fix_fact).get()
+        assert loaded[0].account is FixAccount(self.fix_fact).get()
+
+    def test_load_checks_the_bundle(self, tmpdir):
+        path = tmpdir.join('seed.jsonl')
+        path.write('{"format": "sqlalchemy-fixture-factory-bundle", "version": 0}\n')
+        with pytest.raises(ValueError):
+            load_bundle(self.fix_fact, self.Base.metadata, str(path))
+
+        path.write('{"format": "sqlalchemy-fixture-factory-bundle", "version": 1}\n'
+                   '{"table": "person", "columns": ["id", "last_name"]}\n')
+        with pytest.raises(ValueError):
+            load_bundle(self.fix_fact, self.Base.metadata, str(path))
+
+    def test_tagged_values(self):
+        for value in [datetime.datetime(2015, 6, 1, 12, 30, 5, 10), datetime.date(2015, 6, 1),
+                      datetime.time(12, 30), datetime.timedelta(hours=2), decimal.Decimal('1.10'), b'\x00\xff']:
+            assert value == json.loads(json.dumps(value, default=_encode), object_hook=_decode)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the on-disk fixture cache
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+from sqlalchemy_fixture_factory import sqla_fix_fact
+from sqlalchemy_fixture_factory.cache import FixtureCache
+from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix
+
+from tests import TestCase
+
+
+class TestFixtureCache(TestCase):
+
+    def define_fixtures(self):
+        class AdminRole(BaseFix):
+            MODEL = self.Role
+            name = 'admin'
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'peter'
+            roles = [sqla_fix_fact.subFactoryGet(AdminRole)]
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixAccount)
+
+        return FixAccount, FixPerson
+
+    def test_seed_loads_from_cache(self, tmpdir):
+        cache = FixtureCache(str(tmpdir))
+        FixAccount, FixPerson = self.define_fixtures()
+
+        built = cache.seed(self.fix_fact, self.Base.metadata, [FixPerson(self.fix_fact, first_name='a'),
+                                                                sqla_fix_fact.subFactoryGet(FixPerson)])
+        built_ids = [p.id for p in built]
+        assert 1 == len(tmpdir.listdir())
+
+        # start over with empty tables
+        self.teardown_method(None)
+        self.setup_method(None)
+        FixAccount, FixPerson = self.define_fixtures()
+
+        del self.statements[:]
+        loaded = cache.seed(self.fix_fact, self.Base.metadata, [FixPerson(self.fix_fact, first_name='a'),
+                                                                 sqla_fix_fact.subFactoryGet(FixPerson)])
+
+        inserts = [s for s in self.statements if s.startswith('INSERT')]
+        assert 4 == len(inserts)
+        assert built_ids == [p.id for p in loaded]
+        assert ['a', 'Franz'] == [p.first_name for p in loaded]
+        assert ['admin'] == [r.name for r in loaded[0].account.roles]
+        assert loaded[1] is FixPerson(self.fix_fact).get()
+        assert loaded[0].account is FixAccount(self.fix_fact).get()
+
+    def test_key_changes_with_fixtures(self, tmpdir):
+        cache = FixtureCache(str(tmpdir))
+        FixAccount, FixPerson = self.define_fixtures()
+
+        key = cache.key(self.fix_fact, self.Base.metadata, [FixPerson(self.fix_fact)])
+
+        assert key == cache.key(self.fix_fact, self.Base.metadata, [FixPerson(self.fix_fact)])
+        assert key != cache.key(self.fix_fact, self.Base.metadata, [FixPerson(self.fix_fact, first_name='Sepp')])
+        assert key != cache.key(self.fix_fact, self.Base.metadata, [FixAccount(self.fix_fact)])
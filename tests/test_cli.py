@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the command line interface
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+import pytest
+from sqlalchemy import create_engine, text
+
+from sqlalchemy_fixture_factory import cli
+
+FIXTURES = '''
+from sqlalchemy import Column, ForeignKey, Integer, Unicode
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+from sqlalchemy_fixture_factory import sqla_fix_fact
+from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix
+
+Base = declarative_base()
+
+
+class Account(Base):
+    __tablename__ = 'account'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(Unicode)
+
+
+class Person(Base):
+    __tablename__ = 'person'
+
+    id = Column(Integer, primary_key=True)
+    first_name = Column(Unicode)
+    account_id = Column(Integer, ForeignKey('account.id'))
+    account = relationship(Account)
+
+
+class FixAccount(BaseFix):
+    MODEL = Account
+    name = 'supercheck'
+
+
+class FixPerson(BaseFix):
+    MODEL = Person
+    first_name = 'Franz'
+    account = sqla_fix_fact.subFactoryGet(FixAccount)
+'''
+
+
+@pytest.fixture
+def fixtures_module(tmpdir, monkeypatch):
+    tmpdir.join('cli_fixtures.py').write(FIXTURES)
+    monkeypatch.syspath_prepend(str(tmpdir))
+    return 'cli_fixtures'
+
+
+@pytest.mark.parametrize('orm', [False, True])
+def test_seed(tmpdir, capsys, fixtures_module, orm):
+    url = 'sqlite:///' + str(tmpdir.join('seed.db'))
+
+    assert 0 == cli.main(['seed', fixtures_module + ':FixPerson', '--url', url, '--count', '25', '--batch-size', '10',
+                          '--create-tables'] + (['--orm'] if orm else []))
+
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].endswith('with %s inserts' % ('ORM' if orm else 'Core'))
+    assert 5 == len(out)
+    assert '25/25 rows' in out[-1]
+    assert 'rows/s' in out[-1] and 'statements' in out[-1]
+
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        assert 25 == connection.execute(text('SELECT count(*) FROM person')).scalar()
+        assert 1 == connection.execute(text('SELECT count(*) FROM account')).scalar()
+    engine.dispose()
+
+
+def test_invalid_target(fixtures_module):
+    for target in ['cli_fixtures', 'cli_fixtures:Base', 'cli_fixtures:Missing']:
+        with pytest.raises(SystemExit):
+            cli.main(['seed', target, '--url', 'sqlite://'])
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the materializer
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+from sqlalchemy_fixture_factory import sqla_fix_fact
+from sqlalchemy_fixture_factory.materializer import materialize
+from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix
+
+from tests import TestCase
+
+
+class TestMaterializer(TestCase):
+
+    def define_fixtures(self):
+        class AdminRole(BaseFix):
+            MODEL = self.Role
+            name = 'admin'
+
+        class ViewRole(BaseFix):
+            MODEL = self.Role
+            name = 'view'
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'peter'
+            roles = [sqla_fix_fact.subFactoryGet(AdminRole), sqla_fix_fact.subFactoryGet(ViewRole)]
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixAccount)
+
+        return AdminRole, FixAccount, FixPerson
+
+    def test_materialize_graph(self):
+        AdminRole, FixAccount, FixPerson = self.define_fixtures()
+
+        persons = materialize(self.fix_fact, [FixPerson(self.fix_fact, first_name='p%d' % i) for i in range(3)])
+
+        assert ['p0', 'p1', 'p2'] == [p.first_name for p in persons]
+        assert 3 == self.db_session.query(self.Person).count()
+        assert 1 == self.db_session.query(self.Account).count()
+        assert 2 == self.db_session.query(self.Role).count()
+        assert all(p.account.name == 'peter' for p in persons)
+        assert ['admin', 'view'] == sorted(r.name for r in persons[0].account.roles)
+
+        # fixtures referenced via get are registered
+        del self.statements[:]
+        assert persons[0].account is FixAccount(self.fix_fact).get()
+        assert [] == self.statements
+
+    def test_materialize_one_statement_per_table_with_known_keys(self):
+        AdminRole, FixAccount, FixPerson = self.define_fixtures()
+
+        del self.statements[:]
+        ids = materialize(self.fix_fact, [FixPerson(self.fix_fact, id=i + 1) for i in range(5)], pk_only=True)
+
+        inserts = [s.split()[2] for s in self.statements if s.startswith('INSERT')]
+        assert [1, 2, 3, 4, 5] == ids
+        assert 1 == inserts.count('person')
+        assert 1 == inserts.count('account_role')
+
+    def test_materialize_one_statement_per_table_with_autoincrement_keys(self):
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'peter'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryCreate(FixAccount)
+
+        del self.statements[:]
+        persons = materialize(self.fix_fact, [FixPerson(self.fix_fact) for i in range(50)])
+
+        inserts = [s.split()[2] for s in self.statements if s.startswith('INSERT')]
+        assert ['account', 'person'] == inserts
+        assert 50 == len(set(p.id for p in persons))
+        assert 50 == len(set(p.account.id for p in persons))
+        assert 50 == self.db_session.query(self.Account).count()
+
+    def test_materialize_reuses_registered_fixtures(self):
+        AdminRole, FixAccount, FixPerson = self.define_fixtures()
+
+        account = FixAccount(self.fix_fact).get()
+        person = materialize(self.fix_fact, sqla_fix_fact.subFactoryCreate(FixPerson))
+
+        assert person.account is account
+        assert 1 == self.db_session.query(self.Account).count()
+        assert 2 == self.db_session.query(self.Role).count()
+
+    def test_materialize_looks_up_existing_rows(self):
+        class FixRole(BaseFix):
+            MODEL = self.Role
+            LOOKUP = ('name',)
+
+        self.db_session.add_all([self.Role(name='a'), self.Role(name='c')])
+        self.db_session.flush()
+
+        del self.statements[:]
+        roles = materialize(self.fix_fact, [sqla_fix_fact.subFactoryGet(FixRole, name=name) for name in 'abcd'])
+
+        assert ['a', 'b', 'c', 'd'] == [r.name for r in roles]
+        assert 4 == self.db_session.query(self.Role).count()
+        assert 1 == len([s for s in self.statements if 'role.name IN' in s])
+        assert 1 == len([s for s in self.statements if s.startswith('INSERT')])
+        assert roles[0] is FixRole(self.fix_fact, name='a').get()
+
+    def test_materialize_looks_up_nested_fixtures_at_once(self):
+        class FixRole(BaseFix):
+            MODEL = self.Role
+            LOOKUP = ('name',)
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            LOOKUP = ('name',)
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+
+        self.db_session.add_all([self.Account(name='a'), self.Role(name='r1')])
+        self.db_session.flush()
+
+        del self.statements[:]
+        persons = materialize(self.fix_fact, [
+            FixPerson(self.fix_fact, account=sqla_fix_fact.subFactoryGet(
+                FixAccount, name=name, roles=[sqla_fix_fact.subFactoryGet(FixRole, name='r%d' % i)]))
+            for i, name in enumerate('abc')])
+
+        assert ['a', 'b', 'c'] == [p.account.name for p in persons]
+        assert 3 == self.db_session.query(self.Account).count()
+        # the roles of the existing account are not built
+        assert ['r1', 'r2'] == sorted(r.name for r in self.db_session.query(self.Role))
+        assert 1 == len([s for s in self.statements if 'account.name IN' in s])
+        assert 1 == len([s for s in self.statements if 'role.name IN' in s])
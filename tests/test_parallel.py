@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the generation of rows in a process pool
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+import hashlib
+
+from sqlalchemy_fixture_factory import sqla_fix_fact
+from sqlalchemy_fixture_factory.parallel import stream_parallel
+from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix
+
+from tests import TestCase
+
+
+def payload(index, random):
+    return {'first_name': hashlib.sha256(('%d:%f' % (index, random.random())).encode('utf-8')).hexdigest()}
+
+
+class TestStreamParallel(TestCase):
+
+    def define_fixtures(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        return FixPerson
+
+    def test_stream_parallel(self):
+        FixPerson = self.define_fixtures()
+        FixPerson(self.fix_fact, id=3).create()
+
+        events = list(stream_parallel(FixPerson(self.fix_fact), 5, payload, chunk_size=2, workers=2, commit=False))
+
+        assert [2, 4, 5] == [e.done for e in events]
+        assert [4, 5, 6, 7, 8] == [pk for e in events for pk in e.pks]
+        persons = self.db_session.query(self.Person).order_by(self.Person.id).all()
+        assert 6 == len(persons)
+        assert 1 == self.db_session.query(self.Account).count()
+        assert all(p.account.name == 'supercheck' for p in persons)
+
+        # the rows only depend on the seed and the chunk size, not on the number of processes
+        names = [p.first_name for p in persons[1:]]
+        self.db_session.rollback()
+        FixPerson(self.fix_fact, id=3).create()
+        list(stream_parallel(FixPerson(self.fix_fact), 5, payload, chunk_size=2, workers=1, commit=False))
+        assert names == [p.first_name for p in self.db_session.query(self.Person).order_by(self.Person.id)][1:]
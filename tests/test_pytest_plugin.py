@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the pytest plugin
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+pytest_plugins = ['pytester']
+
+CONFTEST = '''
+import pytest
+from sqlalchemy import Column, Integer, Unicode, create_engine, event
+from sqlalchemy.ext.declarative import declarative_base
+
+pytest_plugins = ['sqlalchemy_fixture_factory.pytest_plugin']
+
+Base = declarative_base()
+
+
+class Person(Base):
+    __tablename__ = 'person'
+
+    id = Column(Integer, primary_key=True)
+    first_name = Column(Unicode)
+
+
+@pytest.fixture(scope='session')
+def fix_fact_engine(tmpdir_factory):
+    engine = create_engine('sqlite:///' + str(tmpdir_factory.mktemp('db').join('test.db')))
+
+    # let SQLAlchemy handle the transactions, pysqlite does not support SAVEPOINT otherwise
+    @event.listens_for(engine, 'connect')
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def do_begin(conn):
+        conn.exec_driver_sql('BEGIN')
+
+    Base.metadata.create_all(engine)
+    return engine
+'''
+
+TESTS = '''
+import pytest
+from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix
+
+from conftest import Person
+
+
+class FixPerson(BaseFix):
+    MODEL = Person
+    first_name = 'Franz'
+
+
+@pytest.fixture(scope='module')
+def franz(fix_fact_module):
+    return FixPerson(fix_fact_module).get()
+
+
+def test_first(fix_fact, franz):
+    FixPerson(fix_fact, first_name='Sepp').get()
+    FixPerson(fix_fact).create()
+
+    assert franz is FixPerson(fix_fact).get()
+    assert 3 == fix_fact.get_db_session().query(Person).count()
+
+
+def test_second(fix_fact, franz):
+    assert franz is FixPerson(fix_fact).get()
+    assert 1 == fix_fact.get_db_session().query(Person).count()
+
+    sepp = FixPerson(fix_fact, first_name='Sepp').get()
+    assert 2 == fix_fact.get_db_session().query(Person).count()
+    assert 'Sepp' == sepp.first_name
+'''
+
+
+def test_fixtures_are_rolled_back_per_test(pytester):
+    pytester.makeconftest(CONFTEST)
+    pytester.makepyfile(TESTS)
+
+    result = pytester.runpytest('-p', 'no:sqlalchemy_fixture_factory')
+
+    result.assert_outcomes(passed=2)
+
+
+def test_report_of_slowest_fixtures(pytester):
+    pytester.makeconftest(CONFTEST)
+    pytester.makepyfile(TESTS)
+
+    result = pytester.runpytest('-p', 'no:sqlalchemy_fixture_factory', '--fix-fact-report=5')
+
+    result.assert_outcomes(passed=2)
+    result.stdout.fnmatch_lines(['*slowest SQLAlchemy fixtures*', '*FixPerson*get*'])
+
+
+def test_commits_in_tests_are_rolled_back(pytester):
+    pytester.makeconftest(CONFTEST)
+    pytester.makepyfile('''
+from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix
+
+from conftest import Person
+
+
+class FixPerson(BaseFix):
+    MODEL = Person
+    first_name = 'Franz'
+
+
+def test_a(fix_fact):
+    FixPerson(fix_fact).create()
+    fix_fact.get_db_session().commit()
+    FixPerson(fix_fact).create()
+    fix_fact.get_db_session().commit()
+    assert 2 == fix_fact.get_db_session().query(Person).count()
+
+
+def test_b(fix_fact):
+    assert 0 == fix_fact.get_db_session().query(Person).count()
+''')
+
+    result = pytester.runpytest('-p', 'no:sqlalchemy_fixture_factory')
+
+    result.assert_outcomes(passed=2)
+
+
+def test_missing_engine_fails(pytester):
+    pytester.makepyfile('''
+pytest_plugins = ['sqlalchemy_fixture_factory.pytest_plugin']
+
+def test_fix_fact(fix_fact):
+    pass
+''')
+
+    result = pytester.runpytest('-p', 'no:sqlalchemy_fixture_factory')
+
+    result.assert_outcomes(errors=1)
+    result.stdout.fnmatch_lines(['*fix_fact_url*'])
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the registries of fixtures built with get()
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+import gc
+
+from sqlalchemy_fixture_factory import sqla_fix_fact
+from sqlalchemy_fixture_factory.registry import IdentityRegistry, memory_size
+from sqlalchemy_fixture_factory.sqla_fix_fact import SqlaFixFact, BaseFix
+
+from tests import TestCase
+
+
+class TestIdentityRegistry(TestCase):
+
+    def setup_method(self, method):
+        super(TestIdentityRegistry, self).setup_method(method)
+        self.fix_fact = SqlaFixFact(self.db_session, registry=IdentityRegistry(self.db_session, max_size=2))
+
+    def define_fixtures(self):
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'peter'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixAccount)
+
+        return FixAccount, FixPerson
+
+    def test_instances_are_not_kept_alive(self):
+        FixAccount, FixPerson = self.define_fixtures()
+
+        person_id = FixPerson(self.fix_fact).get().id
+        gc.collect()
+        assert 0 == len(self.db_session.identity_map)
+
+        del self.statements[:]
+        person = FixPerson(self.fix_fact).get()
+        assert person_id == person.id
+        assert 1 == len(self.statements)
+        assert person is FixPerson(self.fix_fact).get()
+        assert 1 == len(self.statements)
+
+    def test_pending_instances_of_batch(self):
+        FixAccount, FixPerson = self.define_fixtures()
+
+        with self.fix_fact.batch():
+            person = FixPerson(self.fix_fact).get()
+            assert person is FixPerson(self.fix_fact).get()
+
+        assert person is FixPerson(self.fix_fact).get()
+        assert isinstance(self.fix_fact.instances._entries[sqla_fix_fact.registry_key(FixPerson, {})], tuple)
+
+    def test_pending_instances_are_checked_in_linear_time(self):
+        class FixRole(BaseFix):
+            MODEL = self.Role
+
+        registry = IdentityRegistry(self.db_session)
+        fix_fact = SqlaFixFact(self.db_session, registry=registry)
+        checked = []
+        settle_key = registry._settle_key
+        registry._settle_key = lambda key: checked.append(key) or settle_key(key)
+
+        with fix_fact.batch():
+            roles = [FixRole(fix_fact, name='r%d' % i).get() for i in range(1000)]
+
+        assert len(checked) < 2 * len(roles)
+        assert roles[0] is FixRole(fix_fact, name='r0').get()
+        assert isinstance(registry._entries[sqla_fix_fact.registry_key(FixRole, {'name': 'r0'})], tuple)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        FixAccount, FixPerson = self.define_fixtures()
+
+        person = FixPerson(self.fix_fact).get()
+        account = FixAccount(self.fix_fact).get()
+        assert 2 == len(self.fix_fact.instances)
+
+        FixAccount(self.fix_fact, name='a').get()
+        assert 2 == len(self.fix_fact.instances)
+
+        # the person was used least recently, it is built again
+        assert account is FixAccount(self.fix_fact).get()
+        assert person is not FixPerson(self.fix_fact).get()
+        assert 2 == self.db_session.query(self.Person).count()
+
+    def test_rolled_back_entries_are_dropped(self):
+        FixAccount, FixPerson = self.define_fixtures()
+
+        FixAccount(self.fix_fact).get()
+        self.db_session.rollback()
+
+        assert 'peter' == FixAccount(self.fix_fact).get().name
+        assert 1 == self.db_session.query(self.Account).count()
+
+    def test_memory_size(self):
+        FixAccount, FixPerson = self.define_fixtures()
+
+        by_identity = self.fix_fact.instances
+        by_instance = {}
+        for registry in (by_identity, by_instance):
+            fix_fact = SqlaFixFact(self.db_session, registry=registry)
+            FixPerson(fix_fact).get()
+
+        assert 0 < memory_size(by_identity) < memory_size(by_instance)
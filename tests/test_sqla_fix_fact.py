@@ -5,6 +5,9 @@ Tests for the fixture
 """
 
 from __future__ import absolute_import, print_function, unicode_literals, division
+import pytest
+from sqlalchemy import Column, ForeignKey, Integer, Unicode
+from sqlalchemy.orm import relationship
 from sqlalchemy_fixture_factory import sqla_fix_fact
 from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix
 
@@ -194,6 +197,115 @@ class TestFixFact(TestCase):
         assert 'peter' == result.name
         assert 'admin' == result.roles[0].name
 
+    def test_get_looks_up_existing_row(self):
+        class FixSetting(BaseFix):
+            MODEL = self.Setting
+            LOOKUP = ('scope', 'name')
+            scope = 'global'
+            name = 'debug'
+            value = 'off'
+
+        self.db_session.add(self.Setting(scope='global', name='debug', value='on'))
+        self.db_session.flush()
+
+        setting = FixSetting(self.fix_fact).get()
+        assert 'on' == setting.value
+        assert 1 == self.db_session.query(self.Setting).count()
+
+        assert 'off' == FixSetting(self.fix_fact, name='trace').get().value
+        assert 2 == self.db_session.query(self.Setting).count()
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            LOOKUP = ('roles',)
+
+        with pytest.raises(AttributeError):
+            FixAccount(self.fix_fact)
+
+    def test_get_looks_up_referenced_rows_at_once(self):
+        class FixRole(BaseFix):
+            MODEL = self.Role
+            LOOKUP = ('name',)
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            LOOKUP = ('name',)
+            name = 'peter'
+            roles = [sqla_fix_fact.subFactoryGet(FixRole, name='admin'),
+                     sqla_fix_fact.subFactoryGet(FixRole, name='view')]
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixAccount)
+
+        self.db_session.add(self.Role(name='view'))
+        self.db_session.flush()
+
+        del self.statements[:]
+        with self.fix_fact.batch():
+            person = FixPerson(self.fix_fact).get()
+            # the queries do not flush the pending instances of the batch
+            assert 2 == len(self.statements)
+            assert all(s.startswith('SELECT') for s in self.statements)
+
+        assert ['admin', 'view'] == sorted(r.name for r in person.account.roles)
+        assert 2 == self.db_session.query(self.Role).count()
+
+    @pytest.mark.parametrize('lazy', [False, True])
+    def test_rebind(self, lazy):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        person_id = FixPerson(self.fix_fact).get().id
+        FixPerson(self.fix_fact, first_name='Sepp').get()
+        self.db_session.commit()
+        # not committed, dropped by the rebind
+        FixPersonAccount(self.fix_fact, name='nixcheck').get()
+        self.db_session.rollback()
+
+        db_session = self.db_session.__class__(bind=self.engine)
+        del self.statements[:]
+        self.fix_fact.rebind(db_session, lazy=lazy)
+
+        assert (0 if lazy else 2) == len(self.statements)
+        person = FixPerson(self.fix_fact).get()
+        assert person in db_session
+        assert person_id == person.id
+        assert person.account is FixPersonAccount(self.fix_fact).get()
+        assert 'Sepp' == FixPerson(self.fix_fact, first_name='Sepp').get().first_name
+        assert 1 == db_session.query(self.Account).count()
+        assert 'nixcheck' == FixPersonAccount(self.fix_fact, name='nixcheck').get().name
+        db_session.close()
+
+    def test_reference_list_is_inserted_at_once(self):
+        class FixRole(BaseFix):
+            MODEL = self.Role
+            name = 'role'
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'peter'
+            roles = [sqla_fix_fact.subFactoryCreate(FixRole, name='role %d' % i) for i in range(10)]
+
+        self.db_session.add(self.Role(name='existing'))
+        self.db_session.flush()
+
+        del self.statements[:]
+        a = FixAccount(self.fix_fact).create()
+
+        inserts = [s for s in self.statements if s.startswith('INSERT INTO role')]
+        assert 1 == len(inserts)
+        assert 10 == len(a.roles)
+        assert list(range(2, 12)) == sorted(r.id for r in a.roles)
+        assert 11 == self.db_session.query(self.Role).count()
+
     def test_sub_factory_get_delivers_same_instance_on_multiple_instantiations(self):
         class FixPersonAccount(BaseFix):
             MODEL = self.Account
@@ -264,3 +376,590 @@ class TestFixFact(TestCase):
         assert fix_model is not None
         assert 0 == self.db_session.query(self.Person).count()
         assert 0 == self.db_session.query(self.Account).count()
+
+    def test_build_plan_is_compiled_once_per_fixture_class(self):
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+
+        class FixPersonPeter(FixPerson):
+            first_name = 'Peter'
+
+        p1 = FixPerson(self.fix_fact)
+        p2 = FixPerson(self.fix_fact)
+        p3 = FixPersonPeter(self.fix_fact)
+
+        assert p1._plan is p2._plan
+        assert p1._plan is not p3._plan
+        assert 'account' in p1._plan.relationship_keys
+        assert 'Franz' == p1.model().first_name
+        assert 'Peter' == p3.model().first_name
+
+    def test_attributes_set_on_the_fixture_instance(self):
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+
+            def __init__(self, fix_fact, **kwargs):
+                BaseFix.__init__(self, fix_fact, **kwargs)
+                self.first_name = 'from-init'
+
+        assert 'from-init' == FixPerson(self.fix_fact).create().first_name
+        assert 'Sepp' == FixPerson(self.fix_fact, first_name='Sepp').create().first_name
+
+    def test_reference_without_sub_factory_is_rejected(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = FixPersonAccount
+
+        for _ in range(2):
+            with pytest.raises(AttributeError):
+                FixPerson(self.fix_fact)
+
+    def test_create_batch(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        persons = FixPerson(self.fix_fact).create_batch(3, overrides=lambda i: {'first_name': 'Franz %d' % i})
+
+        assert ['Franz 0', 'Franz 1', 'Franz 2'] == [p.first_name for p in persons]
+        assert 3 == len(set(p.id for p in persons))
+        assert 3 == self.db_session.query(self.Person).count()
+        assert 1 == self.db_session.query(self.Account).count()
+        assert all(p.account.name == 'supercheck' for p in persons)
+
+    def test_create_batch_inserts_autoincrement_keys_at_once(self):
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+
+        FixPerson(self.fix_fact).create()
+
+        del self.statements[:]
+        ids = FixPerson(self.fix_fact).create_batch(50, pk_only=True)
+
+        assert list(range(2, 52)) == ids
+        assert 1 == len([s for s in self.statements if s.startswith('INSERT')])
+        assert 51 == self.db_session.query(self.Person).count()
+
+    def test_create_batch_pk_only(self):
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+
+        ids = FixPerson(self.fix_fact).create_batch(2, overrides=[{'id': 10}, {'first_name': 'Sepp'}], pk_only=True)
+
+        assert 10 == ids[0]
+        assert ids[1] is not None
+        assert 'Sepp' == self.db_session.query(self.Person).get(ids[1]).first_name
+
+        with pytest.raises(ValueError):
+            FixPerson(self.fix_fact).create_batch(2, overrides=[{}])
+
+    def test_stream(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        stream = FixPerson(self.fix_fact).stream(5, chunk_size=2, overrides=lambda i: {'first_name': 'Franz %d' % i})
+        assert 0 == self.db_session.query(self.Person).count()
+
+        ids = list(stream)
+        assert 5 == len(set(ids))
+        # only the registered account is left in the session
+        assert 1 == len(self.db_session.identity_map)
+        assert 'Franz 4' == self.db_session.query(self.Person).get(ids[4]).first_name
+        assert 1 == self.db_session.query(self.Account).count()
+
+        events = list(FixPerson(self.fix_fact).stream(3, chunk_size=2, progress=True, commit=False))
+        assert [2, 3] == [e.done for e in events]
+        assert [2, 1] == [len(e.pks) for e in events]
+        assert 3 == len(list(FixPerson(self.fix_fact).stream(3, chunk_size=2, commit=False, core=True)))
+        self.db_session.rollback()
+        assert 5 == self.db_session.query(self.Person).count()
+
+    def test_insert_with_core(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        del self.statements[:]
+        assert 3 == FixPerson(self.fix_fact).insert(3, overrides=lambda i: {'id': i + 1})
+        inserts = [s for s in self.statements if s.startswith('INSERT INTO person')]
+        assert 1 == len(inserts)
+        assert 0 == len([inst for inst in self.db_session.identity_map.values() if isinstance(inst, self.Person)])
+
+        del self.statements[:]
+        ids = FixPerson(self.fix_fact, first_name='Sepp').insert(2, return_pks=True)
+        assert [4, 5] == ids
+        assert 1 == len([s for s in self.statements if s.startswith('INSERT INTO person')])
+        assert 'Sepp' == self.db_session.query(self.Person).get(ids[1]).first_name
+        assert [1] == list(set(p.account_id for p in self.db_session.query(self.Person)))
+
+        class FixSetting(BaseFix):
+            MODEL = self.Setting
+            scope = 'a'
+            name = 'b'
+
+        assert [('a', 'b')] == FixSetting(self.fix_fact).insert(return_pks=True)
+        assert 'on' == self.db_session.query(self.Setting).get(('a', 'b')).value
+
+        class AdminRole(BaseFix):
+            MODEL = self.Role
+            name = 'admin'
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            roles = [sqla_fix_fact.subFactoryGet(AdminRole)]
+
+        with pytest.raises(ValueError):
+            FixAccount(self.fix_fact).insert()
+
+    def test_create_batch_with_reference_list(self):
+        class AdminRole(BaseFix):
+            MODEL = self.Role
+            name = 'admin'
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'peter'
+            roles = [sqla_fix_fact.subFactoryGet(AdminRole)]
+
+        accounts = FixAccount(self.fix_fact).create_batch(2)
+
+        assert 2 == self.db_session.query(self.Account).count()
+        assert 1 == self.db_session.query(self.Role).count()
+        assert all(a.roles[0].name == 'admin' for a in accounts)
+
+    def test_create_does_not_reload_the_model(self):
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+
+        del self.statements[:]
+        p = FixPerson(self.fix_fact).create()
+
+        assert 1 == len(self.statements)
+        assert self.statements[0].startswith('INSERT')
+        assert p.id is not None
+
+    def test_create_loads_server_defaults_with_composite_primary_key(self):
+        class FixSetting(BaseFix):
+            MODEL = self.Setting
+            scope = 'global'
+            name = 'feature'
+
+        del self.statements[:]
+        s = FixSetting(self.fix_fact).create()
+
+        assert 2 == len(self.statements)
+        assert 'on' == s.value
+        assert self.statements[1].startswith('SELECT')
+        assert s is self.db_session.query(self.Setting).get(('global', 'feature'))
+
+    def test_get_of_registered_fixture_emits_no_statements(self):
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+
+        p = FixPerson(self.fix_fact).get()
+
+        del self.statements[:]
+        assert p is FixPerson(self.fix_fact).get()
+        assert [] == self.statements
+
+    def test_get_reattaches_registered_fixture_to_session(self):
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+
+        p = FixPerson(self.fix_fact).get()
+        self.db_session.expunge(p)
+
+        p2 = FixPerson(self.fix_fact).get()
+
+        assert p2 in self.db_session
+        assert p.id == p2.id
+        assert p2 is FixPerson(self.fix_fact).get()
+        assert 1 == self.db_session.query(self.Person).count()
+
+    def test_get_registry_key_is_independent_of_kwargs_order_and_sub_factory_identity(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+
+        p = FixPerson(self.fix_fact, first_name='Sepp', account=sqla_fix_fact.subFactoryGet(FixPersonAccount)).get()
+        p2 = FixPerson(self.fix_fact, account=sqla_fix_fact.subFactoryGet(FixPersonAccount), first_name='Sepp').get()
+
+        assert p is p2
+        assert 1 == self.db_session.query(self.Person).count()
+
+        p3 = FixPerson(self.fix_fact, first_name='Sepp',
+                       account=sqla_fix_fact.subFactoryGet(FixPersonAccount, name='other')).get()
+
+        assert p is not p3
+        assert 2 == self.db_session.query(self.Person).count()
+
+    def test_get_registry_key_distinguishes_fixtures_with_same_name(self):
+        def fixture(name):
+            class FixPerson(BaseFix):
+                MODEL = self.Person
+                first_name = name
+            return FixPerson
+
+        p = fixture('Franz')(self.fix_fact).get()
+        p2 = fixture('Sepp')(self.fix_fact).get()
+
+        assert 'Franz' == p.first_name
+        assert 'Sepp' == p2.first_name
+
+    def test_registry_key(self):
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+
+        assert sqla_fix_fact.registry_key(FixPerson, {'a': 1, 'b': [1, {'c': 2}]}) == \
+            sqla_fix_fact.registry_key(FixPerson, {'b': [1, {'c': 2}], 'a': 1})
+        assert sqla_fix_fact.registry_key(FixPerson, {'a': 1}) != sqla_fix_fact.registry_key(FixPerson, {'a': True})
+        assert sqla_fix_fact.registry_key(FixPerson, {'a': [1]}) != sqla_fix_fact.registry_key(FixPerson, {'a': (1,)})
+
+        # unhashable values are compared by their representation
+        assert sqla_fix_fact.registry_key(FixPerson, {'a': bytearray(b'1')}) == \
+            sqla_fix_fact.registry_key(FixPerson, {'a': bytearray(b'1')})
+        assert sqla_fix_fact.registry_key(FixPerson, {'a': bytearray(b'1')}) != \
+            sqla_fix_fact.registry_key(FixPerson, {'a': bytearray(b'2')})
+        person = self.fix_fact.get(FixPerson, extra=['a', {'b': bytearray(b'1')}])
+        assert person is self.fix_fact.get(FixPerson, extra=['a', {'b': bytearray(b'1')}])
+
+    def test_batch_defers_flush_to_end_of_block(self):
+        class AdminRole(BaseFix):
+            MODEL = self.Role
+            name = 'admin'
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'peter'
+            roles = [sqla_fix_fact.subFactoryGet(AdminRole)]
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixAccount)
+
+        del self.statements[:]
+        with self.fix_fact.batch():
+            persons = [FixPerson(self.fix_fact).create() for _ in range(3)]
+            account = FixAccount(self.fix_fact).get()
+
+            assert [] == self.statements
+            assert persons[0].id is None
+
+        assert all(p.id is not None for p in persons)
+        assert all(p.account is account for p in persons)
+        assert 3 == self.db_session.query(self.Person).count()
+        assert 1 == self.db_session.query(self.Account).count()
+        assert 1 == self.db_session.query(self.Role).count()
+
+    def test_batch_does_not_flush_on_error(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        pending = self.Person(first_name='Sepp')
+        self.db_session.add(pending)
+
+        with pytest.raises(RuntimeError):
+            with self.fix_fact.batch():
+                FixPerson(self.fix_fact).create()
+                raise RuntimeError()
+
+        assert not self.fix_fact.in_batch()
+        assert [pending] == list(self.db_session.new)
+        assert 0 == len(self.fix_fact.instances)
+
+        self.db_session.flush()
+        assert 0 == self.db_session.query(self.Account).count()
+
+    def test_snapshot_and_restore(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        person_id = FixPerson(self.fix_fact).get().id
+        snapshot = self.fix_fact.snapshot()
+
+        FixPerson(self.fix_fact).create()
+        FixPerson(self.fix_fact, first_name='Sepp').get()
+        assert 3 == self.db_session.query(self.Person).count()
+
+        for _ in range(2):
+            self.fix_fact.restore(snapshot)
+
+            assert 1 == self.db_session.query(self.Person).count()
+            assert 1 == self.db_session.query(self.Account).count()
+
+            del self.statements[:]
+            restored = FixPerson(self.fix_fact).get()
+            assert [] == self.statements
+            assert person_id == restored.id
+            assert 'supercheck' == FixPersonAccount(self.fix_fact).get().name
+
+            FixPerson(self.fix_fact).create()
+
+        snapshot.close()
+
+    def test_sharded_workers_do_not_collide(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account_id = 1
+
+        # a row no fixture built, declared foreign keys refer to it as written
+        self.db_session.add(self.Account(id=1, name='shared'))
+        self.db_session.flush()
+
+        workers = [sqla_fix_fact.SqlaFixFact(self.db_session, worker=i, workers=2, shard_size=100000, seed=42)
+                   for i in range(2)]
+
+        accounts = [FixPersonAccount(w).create() for w in workers]
+        persons = [FixPerson(w).create() for w in workers]
+        batch = [FixPerson(w).create_batch(2, pk_only=True) for w in workers]
+
+        assert [10000, 110000] == [a.id for a in accounts]
+        assert [10000, 110000] == [p.id for p in persons]
+        assert [1, 1] == [p.account_id for p in persons]
+        assert [[10001, 10002], [110001, 110002]] == batch
+        assert 6 == self.db_session.query(self.Person).count()
+
+        # a new factory continues behind the rows of the earlier run
+        fix_fact = sqla_fix_fact.SqlaFixFact(self.db_session, worker=1, workers=2, shard_size=100000)
+        assert 110003 == FixPerson(fix_fact).create().id
+
+        assert 100001 == workers[1].shard_pk(1)
+        with pytest.raises(ValueError):
+            workers[0].shard_pk(sqla_fix_fact.EXPLICIT_PK_RANGE)
+
+    def test_sharded_keys_of_joined_table_inheritance(self):
+        class Employee(self.Person):
+            __tablename__ = 'employee'
+
+            id = Column(Integer, ForeignKey('person.id'), primary_key=True)
+            department = Column(Unicode)
+
+        self.Base.metadata.create_all(self.connection)
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+
+        class FixEmployee(BaseFix):
+            MODEL = Employee
+            first_name = 'Sepp'
+            department = 'sales'
+
+        fix_fact = sqla_fix_fact.SqlaFixFact(self.db_session, worker=1, workers=2, shard_size=100000)
+
+        # both share the keys of the person table
+        assert [110000, 110001] == [FixPerson(fix_fact).create().id, FixEmployee(fix_fact).create().id]
+
+    def test_sharded_random_is_deterministic_per_worker(self):
+        def numbers(worker):
+            fix_fact = sqla_fix_fact.SqlaFixFact(self.db_session, worker=worker, workers=2, seed=1)
+            return [fix_fact.random.random() for _ in range(3)]
+
+        assert numbers(0) == numbers(0)
+        assert numbers(0) != numbers(1)
+
+    def test_lazy_references_are_resolved_on_first_read(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryCreate(FixPersonAccount)
+
+        fix_fact = sqla_fix_fact.SqlaFixFact(self.db_session, lazy=True)
+
+        p = FixPerson(fix_fact).create()
+        p2 = FixPerson(fix_fact).get()
+
+        assert 0 == self.db_session.query(self.Account).count()
+        assert p.account_id is None
+
+        assert 'supercheck' == p.account.name
+        self.db_session.flush()
+
+        assert 1 == self.db_session.query(self.Account).count()
+        assert p.account_id == p.account.id
+        assert p2 is FixPerson(fix_fact).get()
+        assert 'supercheck' == p2.account.name
+        assert 2 == self.db_session.query(self.Account).count()
+
+    def test_lazy_references_survive_expiry(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryCreate(FixPersonAccount)
+
+        fix_fact = sqla_fix_fact.SqlaFixFact(self.db_session, lazy=True)
+
+        p = FixPerson(fix_fact).create()
+        self.db_session.commit()
+        assert 0 == self.db_session.query(self.Account).count()
+        assert 'supercheck' == p.account.name
+        self.db_session.commit()
+        assert p.account_id == self.db_session.query(self.Account).one().id
+
+        p2 = FixPerson(fix_fact).create()
+        self.db_session.expire(p2)
+        assert 'Franz' == p2.first_name
+        self.db_session.expire(p2, ['account'])
+        assert 'supercheck' == p2.account.name
+        self.db_session.commit()
+        assert 2 == self.db_session.query(self.Account).count()
+
+        # read references are not built again
+        self.db_session.expire(p2)
+        assert 'supercheck' == p2.account.name
+        assert 2 == self.db_session.query(self.Account).count()
+
+    def test_overwritten_lazy_references_are_not_built(self):
+        class AdminRole(BaseFix):
+            MODEL = self.Role
+            name = 'admin'
+
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'lazyacc'
+            roles = [sqla_fix_fact.subFactoryCreate(AdminRole)]
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryCreate(FixPersonAccount)
+
+        fix_fact = sqla_fix_fact.SqlaFixFact(self.db_session, lazy=True)
+
+        p = FixPerson(fix_fact).create()
+        p.account = self.Account(name='other')
+        self.db_session.flush()
+        account = FixPersonAccount(fix_fact).create()
+        account.roles = [self.Role(name='view')]
+        self.db_session.commit()
+
+        assert 'other' == p.account.name
+        assert ['lazyacc', 'other'] == sorted(a.name for a in self.db_session.query(self.Account))
+        assert ['view'] == [r.name for r in self.db_session.query(self.Role)]
+
+    def test_lazy_references_with_not_null_foreign_key_are_resolved_at_flush(self):
+        class Address(self.Base):
+            __tablename__ = 'address'
+
+            id = Column(Integer, primary_key=True)
+            person_id = Column(Integer, ForeignKey('person.id'), nullable=False)
+            person = relationship(self.Person)
+            account_id = Column(Integer, ForeignKey('account.id'))
+            account = relationship(self.Account)
+
+        self.Base.metadata.create_all(self.connection)
+
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        class FixAddress(BaseFix):
+            MODEL = Address
+            person = sqla_fix_fact.subFactoryModel(FixPerson)
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount, name='other')
+
+        a = FixAddress(sqla_fix_fact.SqlaFixFact(self.db_session, lazy=True)).create()
+
+        assert a.person_id is not None
+        assert a.account_id is None
+        assert 1 == self.db_session.query(self.Person).count()
+        assert 0 == self.db_session.query(self.Account).count()
+
+    def test_instrumentation(self):
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        FixPerson(self.fix_fact).create()
+        instrumentation = self.fix_fact.instrument()
+
+        FixPerson(self.fix_fact).create()
+        FixPerson(self.fix_fact).create()
+        FixPersonAccount(self.fix_fact).get()
+
+        stats = dict(((s.fixture, s.method), s) for s in instrumentation.report())
+        create = stats[(FixPerson, 'create')]
+        get = stats[(FixPersonAccount, 'get')]
+
+        assert 2 == create.calls
+        assert 2 == create.flushes
+        assert 2 == create.statements
+        assert 2 == stats[(FixPerson, 'model')].calls
+        assert 0 == stats[(FixPerson, 'model')].statements
+        assert 3 == get.calls
+        assert 0 == get.statements
+        assert create.seconds > 0
+        assert create is instrumentation.report(top=1)[0]
+        assert 'FixPerson' in instrumentation.format_report()
+
+        assert instrumentation is self.fix_fact.uninstrument()
+        FixPerson(self.fix_fact).create()
+        assert 2 == create.calls
+        assert 2 == create.statements
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the fixture factory shared by several threads
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sqlalchemy_fixture_factory import sqla_fix_fact
+from sqlalchemy_fixture_factory.sqla_fix_fact import BaseFix
+from sqlalchemy_fixture_factory.threaded import ThreadedSqlaFixFact
+
+from tests import TestCase
+
+
+class TestThreadedFixFact(TestCase):
+
+    def test_shared_fixtures_are_created_once(self, tmpdir):
+        engine = create_engine('sqlite:///' + str(tmpdir.join('threads.db')), connect_args={'timeout': 30})
+        self.Base.metadata.create_all(engine)
+        fix_fact = ThreadedSqlaFixFact(sessionmaker(bind=engine))
+
+        created = []
+
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+            def model(self):
+                created.append(self)
+                return BaseFix.model(self)
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        barrier = threading.Barrier(8)
+        accounts = []
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for i in range(5):
+                    person = FixPerson(fix_fact).create()
+                    accounts.append(person.account_id)
+                    assert person.account is FixPersonAccount(fix_fact).get()
+                    fix_fact.get_db_session().commit()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                fix_fact.close()
+
+        threads = [threading.Thread(target=worker) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [] == errors
+        assert 1 == len(created)
+        assert 1 == len(set(accounts))
+
+        db_session = sessionmaker(bind=engine)()
+        assert 40 == db_session.query(self.Person).count()
+        assert 1 == db_session.query(self.Account).count()
+        db_session.close()
+        engine.dispose()
+
+    def test_sharded_threads_share_the_keys_of_the_worker(self, tmpdir):
+        engine = create_engine('sqlite:///' + str(tmpdir.join('threads.db')), connect_args={'timeout': 30})
+        self.Base.metadata.create_all(engine)
+        fix_fact = ThreadedSqlaFixFact(sessionmaker(bind=engine), worker=1, workers=4, shard_size=100000)
+
+        class FixPersonAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+            account = sqla_fix_fact.subFactoryGet(FixPersonAccount)
+
+        barrier = threading.Barrier(3)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for i in range(5):
+                    FixPerson(fix_fact).create()
+                    FixPersonAccount(fix_fact, name='account %d' % i).create()
+                    fix_fact.get_db_session().commit()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                fix_fact.close()
+
+        threads = [threading.Thread(target=worker) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [] == errors
+
+        db_session = sessionmaker(bind=engine)()
+        ids = [p.id for p in db_session.query(self.Person)]
+        assert 15 == len(ids)
+        assert all(110000 <= i < 200000 for i in ids)
+        assert 16 == db_session.query(self.Account).count()
+        db_session.close()
+        engine.dispose()
+
+    def test_registry_is_rejected(self):
+        with pytest.raises(ValueError):
+            ThreadedSqlaFixFact(sessionmaker(bind=self.engine), registry={})
+
+    def test_shared_fixture_with_uncommitted_writes_on_sqlite(self, tmpdir):
+        engine = create_engine('sqlite:///' + str(tmpdir.join('threads.db')), connect_args={'timeout': 1})
+        self.Base.metadata.create_all(engine)
+        fix_fact = ThreadedSqlaFixFact(sessionmaker(bind=engine))
+
+        class FixAccount(BaseFix):
+            MODEL = self.Account
+            name = 'supercheck'
+
+        class FixPerson(BaseFix):
+            MODEL = self.Person
+            first_name = 'Franz'
+
+        FixPerson(fix_fact).create()
+        with pytest.raises(ValueError):
+            FixPerson(fix_fact, account=sqla_fix_fact.subFactoryGet(FixAccount, name='b')).create()
+
+        fix_fact.get_db_session().commit()
+        person = FixPerson(fix_fact, account=sqla_fix_fact.subFactoryGet(FixAccount, name='b')).create()
+        fix_fact.get_db_session().commit()
+        assert 'b' == person.account.name
+        fix_fact.close()
+        engine.dispose()